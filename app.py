@@ -1,12 +1,47 @@
-from flask import Flask, request, render_template, flash, redirect, url_for, jsonify, session
+from flask import Flask, Response, abort, request, render_template, flash, redirect, url_for, jsonify, session, send_file
 import logging
 import os
-from src.embeddings import SentenceTransformerEmbeddings, format_code_for_display
-from langchain_community.vectorstores import Qdrant
-from langchain.text_splitter import RecursiveCharacterTextSplitter
+import json
+import re
+import shutil
+import hashlib
+import sys
+import tempfile
+import time
+from src.embeddings import QueryBatcher, get_embeddings, get_loaded_embeddings
 import requests
+from requests.adapters import HTTPAdapter
 from qdrant_client import QdrantClient
-from threading import Thread, Lock
+from qdrant_client.models import (
+    CreateAlias, CreateAliasOperation, DeleteAlias, DeleteAliasOperation, PointStruct
+)
+from src.query_cache import QueryCache, normalise_query
+from src.highlighting import Highlighter
+from src.metrics import IndexingProgress, MetricsRegistry
+from src.jobs import FairSemaphore, JobCancelled, JobScheduler
+from src.repositories import DEFAULT_REPOSITORY, load_repositories
+from src.vectorstore import (
+    LocalVectorStore, QdrantStore, create_qdrant_payload_indexes, qdrant_vector_params
+)
+from src.chunker import CodeChunker
+from src.search_filters import chunk_fields, parse_filters
+from src.walker import IgnoreMatcher, resolve_paths, scan_repository
+from src.file_filter import FileFilter
+from src.gitinfo import changed_since, current_branch, head_commit, local_branches
+from src.watcher import RepositoryWatcher
+from src.manifest import IndexManifest, data_hash, chunk_point_id
+from src.snapshot import (
+    SNAPSHOT_DTYPES, iter_snapshot, read_snapshot_header, read_snapshot_manifest, write_snapshot
+)
+from src.lexical import LexicalIndex, is_identifier_query, reciprocal_rank_fusion
+from src.pipeline import (
+    UpsertBatcher, completed_future, init_split_worker, iter_in_background,
+    ordered_map, split_in_worker
+)
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from threading import Lock
 from flask import has_request_context, current_app
 
 # Set up basic logging
@@ -15,38 +50,202 @@ logger = logging.getLogger(__name__)
 
 logger.info('Starting the application...')
 
-repo_path = "/app/repo"
+# Repository indexed when no repositories file is configured
+DEFAULT_REPO_PATH = "/app/repo"
 
-# Global state for indexing progress
-indexing_progress = {
-    'current': 0,
-    'total': 0,
-    'status': 'idle',
-    'message': '',
-    'phase': 'idle',
-    'indexed_files': []
+# Named repositories: a JSON file mapping each name to its path and settings
+REPOSITORIES_FILE = os.environ.get('REPOSITORIES_FILE', '/app/repositories.json')
+
+# Vector store backend: 'qdrant' (the vectorstore service) or 'local' (in-process)
+VECTOR_BACKEND = os.environ.get('VECTOR_BACKEND', 'qdrant')
+
+# Vector store location
+VECTORSTORE_URL = "http://vectorstore:6333"
+COLLECTION_NAME = "code_chunks"
+
+# One Qdrant client (and one HTTP session) is shared by every request and reused
+# across them; gRPC is optional and needs the service's port 6334
+QDRANT_PREFER_GRPC = os.environ.get('QDRANT_PREFER_GRPC', 'false').lower() == 'true'
+QDRANT_TIMEOUT = int(os.environ.get('QDRANT_TIMEOUT', 60))
+
+# Persistent index state (file manifest etc.) lives outside the repo mount
+INDEX_DATA_DIR = os.environ.get('INDEX_DATA_DIR', '/app/data')
+MANIFEST_PATH = os.path.join(INDEX_DATA_DIR, 'manifest.json')
+
+# Local backend: memory-mapped vectors and metadata columns, flat or IVF search
+LOCAL_INDEX_ROOT = os.path.join(INDEX_DATA_DIR, 'local_index')
+
+# BM25 index over the same chunks, one file per index (and per build while it is written)
+LEXICAL_INDEX_DIR = os.path.join(INDEX_DATA_DIR, 'lexical')
+# Storage precision for new indexes: 'float32', 'float16' or 'int8'
+VECTOR_DTYPE = os.environ.get('VECTOR_DTYPE', 'float32')
+
+LOCAL_INDEX_OPTIONS = {
+    'dtype': VECTOR_DTYPE,
+    'index_type': os.environ.get('LOCAL_INDEX_TYPE', 'flat'),
+    'nprobe': int(os.environ.get('LOCAL_INDEX_NPROBE', 8)),
+    'ivf_min_points': int(os.environ.get('LOCAL_INDEX_IVF_MIN_POINTS', 50_000))
 }
 
-# Messages to cycle through during vector creation
-VECTOR_MESSAGES = [
-    'Creating vector index... This may take a few minutes.',
-    'Creating vector index... Please wait, still indexing',
-    'Creating vector index... Don\'t leave this page',
-    'Creating vector index... Your patience is appreciated'
-]
+# Chunk embeddings are cached on disk by content hash and reused across reindexes
+EMBEDDING_CACHE_DIR = os.path.join(INDEX_DATA_DIR, 'embedding_cache')
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.environ.get('EMBEDDING_CACHE_MAX_ENTRIES', 200_000))
+
+# Git checkouts keep one index snapshot per branch (a collection, or a local index
+# directory); a new branch starts as a copy of the active snapshot. Snapshots of
+# deleted branches are dropped, and of the others at most BRANCH_SNAPSHOTS_MAX
+# (least recently used first) are kept besides the one being served
+BRANCH_SNAPSHOTS = os.environ.get('BRANCH_SNAPSHOTS', 'true').lower() == 'true'
+BRANCH_SNAPSHOTS_MAX = int(os.environ.get('BRANCH_SNAPSHOTS_MAX', 5))
+ACTIVE_INDEX_PATH = os.path.join(INDEX_DATA_DIR, 'active_index.json')
+
+# Full rebuilds go into a fresh build of an index ('<name>__v<ms>') that the index
+# name (a Qdrant alias, or a symlink for the local backend) is switched to at the end
+INDEX_VERSION_PATTERN = re.compile(r'__v\d+$')
+
+# Exported index files (vectors, chunks and manifest in one archive) for seeding
+# other instances; vectors are stored at SNAPSHOT_DTYPE precision
+SNAPSHOT_DIR = os.path.join(INDEX_DATA_DIR, 'snapshots')
+SNAPSHOT_DTYPE = os.environ.get('SNAPSHOT_DTYPE', 'float16')
+
+# Each repository tracks the progress of its indexing runs; the last
+# PROGRESS_FILE_LOG_SIZE processed paths are kept for the incremental file
+# feed of the progress page
+PROGRESS_FILE_LOG_SIZE = int(os.environ.get('PROGRESS_FILE_LOG_SIZE', 10000))
+PROGRESS_STREAM_INTERVAL = 0.5
+
+# Counters and timers for indexing and search, served on /metrics
+metrics = MetricsRegistry(prefix='coderag_')
+files_scanned = metrics.counter('files_scanned_total', 'Files checked against the manifest while indexing')
+files_skipped = metrics.counter_family('files_skipped_total', 'Files left out of the index by the pre-filter', 'reason')
+bytes_read = metrics.counter('bytes_read_total', 'Bytes of source read (hashed or loaded) while indexing')
+chunks_produced = metrics.counter('chunks_produced_total', 'Chunks produced by splitting changed files')
+chunks_embedded = metrics.counter('chunks_embedded_total', 'Chunks embedded and written to the index')
+embed_batches = metrics.counter('embed_batches_total', 'Embedding batches run while indexing')
+embed_seconds = metrics.histogram('embed_batch_seconds', 'Time to embed one indexing batch')
+upsert_seconds = metrics.histogram('upsert_batch_seconds', 'Time to write one batch to the vector store and BM25 index')
+checkpoint_seconds = metrics.histogram('checkpoint_seconds', 'Time to persist the index, manifest and embedding cache')
+queries_total = metrics.counter('queries_total', 'Searches run, including ones served from the result cache')
+query_seconds = metrics.histogram('query_seconds', 'End-to-end /query handling time')
+query_embed_seconds = metrics.histogram('query_embed_seconds', 'Time to embed a query (cache misses only)')
+vector_search_seconds = metrics.histogram('vector_search_seconds', 'Time for one vector store search')
+lexical_search_seconds = metrics.histogram('lexical_search_seconds', 'Time for one BM25 search')
+highlight_seconds = metrics.histogram('highlight_seconds', 'Time to highlight one result snippet')
+indexing_files_total = metrics.gauge('indexing_files_total', 'Files in the running (or last) indexing pass')
+indexing_files_done = metrics.gauge('indexing_files_done', 'Files processed so far in the indexing pass')
+indexing_chunks_per_second = metrics.gauge('indexing_chunks_per_second', 'Chunks embedded per second in the indexing pass')
+indexing_eta_seconds = metrics.gauge('indexing_eta_seconds', 'Estimated seconds until the indexing pass completes')
+
+# Upper bound on chunk size; chunks follow definition boundaries and never overlap
+CHUNK_MAX_CHARS = int(os.environ.get('CHUNK_MAX_CHARS', 2000))
+
+# Files over MAX_FILE_BYTES, binary and generated files and minified code (lines
+# over MAX_LINE_LENGTH, or too few newlines) are skipped before they are embedded.
+# A repository's 'file_limits' setting changes the limits per glob pattern.
+MAX_FILE_BYTES = int(os.environ.get('MAX_FILE_BYTES', 512_000))
+MAX_LINE_LENGTH = int(os.environ.get('MAX_LINE_LENGTH', 5000))
+
+# Bumped when the metadata stored with each chunk changes; indexes are rebuilt once to pick it up
+CHUNK_METADATA_VERSION = 2
+
+# Chunks are embedded and written in batches of this size as files are read.
+# Each batch is one encode() call, which length-sorts it into model batches of
+# EMBEDDING_BATCH_SIZE, so a larger window means less padding per model batch.
+EMBED_BATCH_SIZE = int(os.environ.get('INDEX_EMBED_BATCH_SIZE', 256))
+
+# Embedding model, optionally loaded from a local directory instead of the hub
+EMBEDDING_MODEL = os.environ.get('EMBEDDING_MODEL', 'all-MiniLM-L6-v2')
+EMBEDDING_MODEL_PATH = os.environ.get('EMBEDDING_MODEL_PATH')
+
+# Load and warm up the model at startup rather than on first use
+PRELOAD_MODEL = os.environ.get('PRELOAD_MODEL', 'true').lower() == 'true'
+
+# Model-level encode settings
+EMBEDDING_OPTIONS = {
+    'batch_size': int(os.environ.get('EMBEDDING_BATCH_SIZE', 32)),
+    'normalize': os.environ.get('EMBEDDING_NORMALIZE', 'false').lower() == 'true'
+}
+
+# Persist the manifest (and drop replaced points) every this many batches
+CHECKPOINT_EVERY_BATCHES = 20
+
+# Worker pools for the file phase: threads read files, processes split them.
+# INDEX_SPLIT_WORKERS=0 splits inline in the reader pipeline thread instead.
+INDEX_READ_WORKERS = int(os.environ.get('INDEX_READ_WORKERS', 8))
+INDEX_SPLIT_WORKERS = int(os.environ.get('INDEX_SPLIT_WORKERS', max(1, (os.cpu_count() or 2) - 1)))
+# The split processes are started once and kept; syncs of fewer files (most
+# watcher batches) split inline rather than wait on them
+SPLIT_POOL_MIN_FILES = 64
+split_pools = {}  # chunker signature -> ProcessPoolExecutor
+split_pool_lock = Lock()
+
+# Files read and split ahead of the embedding stage
+PIPELINE_QUEUE_SIZE = 32
+
+# Watch each repository and apply changes incrementally (inotify when available, else polling)
+WATCH_REPO = os.environ.get('WATCH_REPO', 'false').lower() == 'true'
+WATCH_BACKEND = os.environ.get('WATCH_BACKEND', 'auto')
+WATCH_DEBOUNCE_SECONDS = float(os.environ.get('WATCH_DEBOUNCE_SECONDS', 2))
+WATCH_MAX_WAIT_SECONDS = float(os.environ.get('WATCH_MAX_WAIT_SECONDS', 30))
+WATCH_POLL_INTERVAL = float(os.environ.get('WATCH_POLL_INTERVAL', 5))
+
+# Indexing jobs run on JOB_WORKERS threads, never two for the same repository.
+# EMBED_CONCURRENCY caps the embedding batches in flight across all jobs; waiting
+# jobs take turns per batch, so a large repository cannot starve the others.
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 2))
+EMBED_CONCURRENCY = int(os.environ.get('EMBED_CONCURRENCY', 1))
+embed_slots = FairSemaphore(EMBED_CONCURRENCY)
+
+# Serialises read-modify-write of the active index file across repositories
+active_index_lock = Lock()
+
+# Shared vector store clients, created on first use
+qdrant_client = None
+http_session = None
+clients_lock = Lock()
+
+# Number of nearest chunks fetched per query
+SEARCH_K = 10
 
-# Add locks for thread safety
-indexing_lock = Lock()
-docsearch_lock = Lock()
+# Fuse BM25 hits with vector hits (reciprocal rank fusion); identifier queries skip the model
+LEXICAL_SEARCH = os.environ.get('LEXICAL_SEARCH', 'true').lower() == 'true'
+RRF_K = 60
 
-# Global variable for the search index
-docsearch = None
+# Query vector and result caches; results are invalidated whenever the index changes
+query_cache = QueryCache(
+    max_vectors=int(os.environ.get('QUERY_CACHE_VECTORS', 1024)),
+    max_results=int(os.environ.get('QUERY_CACHE_RESULTS', 256)),
+    ttl=int(os.environ.get('QUERY_CACHE_TTL', 600))
+)
+
+# Query embeddings from concurrent requests are encoded together
+QUERY_BATCH_MAX = int(os.environ.get('QUERY_BATCH_MAX', 32))
+QUERY_BATCH_WAIT_MS = float(os.environ.get('QUERY_BATCH_WAIT_MS', 2))
+
+# Rendered snippet HTML, keyed by chunk hash, language and first line number.
+# With LAZY_HIGHLIGHT the results page shows plain code and fetches each
+# highlighted snippet from /highlight afterwards.
+highlighter = Highlighter(max_entries=int(os.environ.get('HIGHLIGHT_CACHE_SIZE', 2048)))
+LAZY_HIGHLIGHT = os.environ.get('LAZY_HIGHLIGHT', 'false').lower() == 'true'
+
+query_batcher = QueryBatcher(
+    lambda texts: get_shared_embeddings().embed_queries_array(texts),
+    max_batch=QUERY_BATCH_MAX,
+    max_wait=QUERY_BATCH_WAIT_MS / 1000
+)
 
 # Initialize Flask app
 app = Flask(__name__)
 app.static_folder = 'static'  # Make sure static folder is configured
 app.secret_key = os.urandom(24)  # Or use a fixed secret key if you prefer
 
+# Flask debug mode (and its reloader)
+DEBUG = True
+
+# 'flask' runs the development server; 'waitress' serves requests from a thread pool
+SERVER = os.environ.get('SERVER', 'flask')
+SERVER_THREADS = int(os.environ.get('SERVER_THREADS', 16))
+
 # Directories to skip
 SKIP_DIRS = {
     # Package managers and dependencies
@@ -124,33 +323,660 @@ DEFAULT_SETTINGS = {
     'skip_dirs': list(SKIP_DIRS)
 }
 
-# Add debug logging for directory skipping
-def should_skip_directory(dirname, skip_dirs=None):
-    """Check if a directory should be skipped during indexing."""
-    skip_dirs = skip_dirs or DEFAULT_SETTINGS['skip_dirs']
-    should_skip = dirname.lower() in skip_dirs or 'cache' in dirname.lower()
-    if should_skip:
-        logger.debug(f"Skipping directory: {dirname}")
-    return should_skip
+repositories = load_repositories(
+    REPOSITORIES_FILE, DEFAULT_REPO_PATH, COLLECTION_NAME, DEFAULT_SETTINGS,
+    lambda: IndexingProgress(file_log_size=PROGRESS_FILE_LOG_SIZE)
+)
+
+# Outcome of reading one candidate file; chunk fields are filled in for changed files
+# and ``reason`` for skipped ones
+FileResult = namedtuple(
+    'FileResult', ['rel_path', 'status', 'code', 'chunks', 'metadatas', 'point_ids', 'entry', 'reason'],
+    defaults=[None, None, None, None, None, None]
+)
+
+def make_file_filter(settings):
+    """The pre-filter for a repository, with its per-pattern ``file_limits`` overrides."""
+    return FileFilter(
+        max_bytes=MAX_FILE_BYTES,
+        max_line_length=MAX_LINE_LENGTH,
+        overrides=settings.get('file_limits')
+    )
+
+def selection_digest(settings):
+    """Digest of the settings that decide which files of a repository are indexed."""
+    selection = {
+        'skip_dirs': sorted(settings['skip_dirs']),
+        'file_patterns': sorted(settings['file_patterns']),
+        'file_limits': make_file_filter(settings).describe()
+    }
+    return hashlib.sha1(json.dumps(selection, sort_keys=True).encode('utf-8')).hexdigest()
+
+def get_split_pool(chunker, file_count):
+    """The shared process pool for splitting, or None to split inline in the producer thread.
+
+    Worker processes are forked on first use and reused by every later sync
+    with the same chunking, instead of being forked again for each one.
+    """
+    if INDEX_SPLIT_WORKERS <= 0 or file_count < SPLIT_POOL_MIN_FILES:
+        return None
+    with split_pool_lock:
+        pool = split_pools.get(chunker.signature)
+        if pool is None:
+            pool = ProcessPoolExecutor(
+                max_workers=INDEX_SPLIT_WORKERS,
+                initializer=init_split_worker,
+                initargs=(chunker,)
+            )
+            split_pools[chunker.signature] = pool
+        return pool
+
+def discard_split_pool(chunker):
+    """Forget a broken split pool so the next sync starts a new one."""
+    with split_pool_lock:
+        pool = split_pools.pop(chunker.signature, None)
+    if pool is not None:
+        pool.shutdown(wait=False)
+
+def get_shared_embeddings(warm_up=False):
+    """The process-wide embedding model, shared by indexing and queries."""
+    return get_embeddings(
+        EMBEDDING_MODEL,
+        warm_up=warm_up,
+        model_path=EMBEDDING_MODEL_PATH,
+        cache_dir=EMBEDDING_CACHE_DIR,
+        cache_max_entries=EMBEDDING_CACHE_MAX_ENTRIES,
+        **EMBEDDING_OPTIONS
+    )
+
+def is_serving_process():
+    """False in the Flask debug reloader's parent process, which never serves requests."""
+    return SERVER != 'flask' or not DEBUG or os.environ.get('WERKZEUG_RUN_MAIN') == 'true'
+
+def get_qdrant_client():
+    """The process-wide Qdrant client; its connection pool is shared by all threads."""
+    global qdrant_client
+    if qdrant_client is None:
+        with clients_lock:
+            if qdrant_client is None:
+                qdrant_client = QdrantClient(
+                    url=VECTORSTORE_URL, prefer_grpc=QDRANT_PREFER_GRPC, timeout=QDRANT_TIMEOUT
+                )
+    return qdrant_client
+
+def get_http_session():
+    """Keep-alive session for the raw REST calls to the vector store."""
+    global http_session
+    if http_session is None:
+        with clients_lock:
+            if http_session is None:
+                new_session = requests.Session()
+                new_session.mount('http://', HTTPAdapter(pool_maxsize=SERVER_THREADS))
+                http_session = new_session
+    return http_session
+
+def default_repository():
+    """The repository used when a request names none: the first one configured."""
+    return next(iter(repositories.values()))
+
+def get_repository(name):
+    """The named repository (the default one for an empty name), or None."""
+    if not name:
+        return default_repository()
+    return repositories.get(name)
+
+def index_name(repo, branch):
+    """Name of the index snapshot (collection or local directory) for a repository's git branch."""
+    if not BRANCH_SNAPSHOTS or not branch:
+        return repo.collection
+    # Keep names readable but collision-free ('feature/x' vs 'feature-x')
+    slug = re.sub(r'[^A-Za-z0-9_-]+', '-', branch).strip('-')[:40]
+    digest = hashlib.sha1(branch.encode('utf-8')).hexdigest()[:8]
+    return f"{repo.collection}__{slug}-{digest}"
+
+def local_index_dir(name):
+    return os.path.join(LOCAL_INDEX_ROOT, name)
+
+def manifest_path(name):
+    """Each snapshot has its own manifest; the default index keeps the original location."""
+    if name == COLLECTION_NAME:
+        return MANIFEST_PATH
+    return os.path.join(INDEX_DATA_DIR, 'manifests', f"{name}.json")
+
+def lexical_path(name):
+    return os.path.join(LEXICAL_INDEX_DIR, f"{name}.json")
+
+def serving_lexical(path):
+    """The lexical index at ``path`` if some repository is serving it."""
+    for repo in repositories.values():
+        if repo.lexical_index is not None and repo.lexical_index.path == path:
+            return repo.lexical_index
+    return None
+
+def serving_local_store(name):
+    """The local store some repository is serving ``name`` through, so writes go to that instance."""
+    for repo in repositories.values():
+        if isinstance(repo.docsearch, LocalVectorStore) and is_same_local_index(repo.docsearch, name):
+            return repo.docsearch
+    return None
+
+def open_lexical(name):
+    """The lexical index for ``name``, reusing the one being served if it matches."""
+    serving = serving_lexical(lexical_path(name))
+    if serving is not None:
+        return serving
+    return LexicalIndex.load(lexical_path(name))
+
+def read_active_index_file():
+    """{'indexes': {repository: snapshot served last}, 'used': {snapshot: time last served}}."""
+    try:
+        with open(ACTIVE_INDEX_PATH, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {'indexes': {}, 'used': {}}
+    if 'indexes' in data:
+        return {'indexes': data['indexes'], 'used': data.get('used', {})}
+    # The file from before repositories holds the default one's
+    return {'indexes': {DEFAULT_REPOSITORY: data['name']} if 'name' in data else {}, 'used': {}}
+
+def write_active_index_file(data):
+    os.makedirs(INDEX_DATA_DIR, exist_ok=True)
+    tmp_path = f"{ACTIVE_INDEX_PATH}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f)
+    os.replace(tmp_path, ACTIVE_INDEX_PATH)
+
+def read_active_indexes():
+    """{repository: snapshot served last}."""
+    return read_active_index_file()['indexes']
+
+def load_active_index(repo):
+    """Name of the repository's snapshot that was served last, so restarts pick it up again."""
+    return read_active_indexes().get(repo.name, repo.collection)
+
+def save_active_index(repo, name):
+    with active_index_lock:
+        data = read_active_index_file()
+        data['indexes'][repo.name] = name
+        data['used'][name] = time.time()
+        write_active_index_file(data)
+
+def forget_snapshot(name):
+    with active_index_lock:
+        data = read_active_index_file()
+        if data['used'].pop(name, None) is not None:
+            write_active_index_file(data)
+
+def new_index_version(name):
+    """Physical collection (or local directory) name for a fresh build of an index."""
+    return f"{name}__v{time.time_ns() // 1_000_000}"
+
+def list_physical_indexes():
+    """Collections (or local directories) that hold index data, including builds."""
+    if VECTOR_BACKEND == 'local':
+        if not os.path.isdir(LOCAL_INDEX_ROOT):
+            return []
+        return sorted(
+            name for name in os.listdir(LOCAL_INDEX_ROOT)
+            if name.startswith(COLLECTION_NAME) and not os.path.islink(local_index_dir(name))
+        )
+    client = get_qdrant_client()
+    return sorted(c.name for c in client.get_collections().collections if c.name.startswith(COLLECTION_NAME))
+
+def list_qdrant_aliases(client):
+    return {a.alias_name: a.collection_name for a in client.get_aliases().aliases}
+
+def publish_index(name, version):
+    """Point ``name`` at the ``version`` build in one atomic step, then drop older builds.
+
+    Queries address indexes by name (a Qdrant alias, or a symlink for the local
+    backend), so they move from the old build to the new one without a gap.
+    """
+    if VECTOR_BACKEND == 'local':
+        link = local_index_dir(name)
+        if os.path.isdir(link) and not os.path.islink(link):
+            # Index from before versioning: move it aside so the name can become a link
+            os.rename(link, local_index_dir(f"{name}__v0"))
+        tmp_link = f"{link}.tmp"
+        if os.path.lexists(tmp_link):
+            os.remove(tmp_link)
+        os.symlink(version, tmp_link)
+        os.replace(tmp_link, link)
+    else:
+        client = get_qdrant_client()
+        aliases = list_qdrant_aliases(client)
+        operations = []
+        if name in aliases:
+            operations.append(DeleteAliasOperation(delete_alias=DeleteAlias(alias_name=name)))
+        elif client.collection_exists(name):
+            # Collection from before aliases: it has to go before its name can become an alias
+            logger.info(f"Replacing unversioned collection {name}")
+            client.delete_collection(name)
+        operations.append(CreateAliasOperation(
+            create_alias=CreateAlias(collection_name=version, alias_name=name)
+        ))
+        client.update_collection_aliases(change_aliases_operations=operations)
+    if os.path.exists(lexical_path(version)):
+        os.replace(lexical_path(version), lexical_path(name))
+    logger.info(f"Index {name} now points at {version}")
+    drop_index_versions(name, keep=version)
+
+def drop_index_versions(name, keep=None):
+    """Delete the builds of ``name`` other than ``keep``."""
+    pattern = re.compile(re.escape(name) + INDEX_VERSION_PATTERN.pattern)
+    for old in list_physical_indexes():
+        if old != keep and pattern.fullmatch(old):
+            logger.info(f"Dropping old index build {old}")
+            drop_physical_index(old)
+
+def drop_physical_index(version):
+    if os.path.exists(lexical_path(version)):
+        os.remove(lexical_path(version))
+    if VECTOR_BACKEND == 'local':
+        # Stores still serving in-flight queries keep their memory maps after the unlink
+        shutil.rmtree(local_index_dir(version), ignore_errors=True)
+    else:
+        get_qdrant_client().delete_collection(version)
+
+def copy_index(source, target):
+    """Seed a new snapshot with a copy of another one's vectors and manifest; nothing is re-embedded."""
+    logger.info(f"Creating index snapshot {target} from {source}")
+    version = new_index_version(target)
+    if VECTOR_BACKEND == 'local':
+        serving = serving_local_store(source)
+        if serving is not None:
+            serving.persist()
+        shutil.copytree(os.path.realpath(local_index_dir(source)), local_index_dir(version))
+    else:
+        client = get_qdrant_client()
+        info = client.get_collection(source)
+        client.create_collection(
+            collection_name=version,
+            vectors_config=info.config.params.vectors,
+            quantization_config=info.config.quantization_config
+        )
+        create_qdrant_payload_indexes(client, version)
+        offset = None
+        while True:
+            points, offset = client.scroll(
+                source, limit=1000, offset=offset, with_payload=True, with_vectors=True
+            )
+            if points:
+                client.upsert(version, points=[
+                    PointStruct(id=point.id, vector=point.vector, payload=point.payload)
+                    for point in points
+                ], wait=True)
+            if offset is None:
+                break
+    if os.path.exists(manifest_path(source)):
+        os.makedirs(os.path.dirname(manifest_path(target)), exist_ok=True)
+        shutil.copyfile(manifest_path(source), manifest_path(target))
+    if os.path.exists(lexical_path(source)):
+        serving = serving_lexical(lexical_path(source))
+        if serving is not None:
+            serving.save()
+        shutil.copyfile(lexical_path(source), lexical_path(version))
+    publish_index(target, version)
+
+def list_branch_snapshots(repo):
+    """Names of a repository's branch snapshots (not its builds) on the configured backend."""
+    if VECTOR_BACKEND == 'local':
+        names = os.listdir(LOCAL_INDEX_ROOT) if os.path.isdir(LOCAL_INDEX_ROOT) else []
+    else:
+        client = get_qdrant_client()
+        names = list(list_qdrant_aliases(client)) + [c.name for c in client.get_collections().collections]
+    return sorted({
+        name for name in names
+        if name.startswith(f"{repo.collection}__") and not INDEX_VERSION_PATTERN.search(name)
+        and not name.endswith('.tmp')
+    })
+
+def drop_snapshot(name):
+    """Delete a branch snapshot: the name, every build behind it, its manifest and lexical index."""
+    logger.info(f"Dropping index snapshot {name}")
+    if VECTOR_BACKEND == 'local':
+        path = local_index_dir(name)
+        if os.path.islink(path):
+            os.remove(path)
+        else:
+            shutil.rmtree(path, ignore_errors=True)
+    else:
+        client = get_qdrant_client()
+        if name in list_qdrant_aliases(client):
+            client.update_collection_aliases(change_aliases_operations=[
+                DeleteAliasOperation(delete_alias=DeleteAlias(alias_name=name))
+            ])
+        elif client.collection_exists(name):
+            client.delete_collection(name)
+    drop_index_versions(name)
+    for path in (manifest_path(name), lexical_path(name)):
+        if os.path.exists(path):
+            os.remove(path)
+    forget_snapshot(name)
+
+def prune_branch_snapshots(repo):
+    """Drop the snapshots of deleted branches, then all but the BRANCH_SNAPSHOTS_MAX most recently used.
+
+    The snapshot being served is never dropped and does not count towards the
+    limit. Runs under the repository's indexing lock.
+    """
+    branches = local_branches(repo.path)
+    if not BRANCH_SNAPSHOTS or branches is None:
+        return
+    existing = {index_name(repo, branch) for branch in branches}
+    used = read_active_index_file()['used']
+    snapshots = [name for name in list_branch_snapshots(repo) if name != repo.active_index]
+    stale = [name for name in snapshots if name not in existing]
+    kept = sorted((name for name in snapshots if name in existing), key=lambda name: used.get(name, 0), reverse=True)
+    stale.extend(kept[BRANCH_SNAPSHOTS_MAX:])
+    for name in stale:
+        drop_snapshot(name)
+
+def is_same_local_index(store, name):
+    """True if a local store reads the build the name currently points at."""
+    return os.path.realpath(store.directory) == os.path.realpath(local_index_dir(name))
+
+def open_vector_store(embeddings, name=COLLECTION_NAME):
+    """Open the named index on the configured backend, creating it if needed.
+
+    Returns the store and whether the index had to be created.
+    """
+    if VECTOR_BACKEND == 'local':
+        directory = local_index_dir(name)
+        serving = serving_local_store(name)
+        if serving is not None:
+            # Keep writing through the instance that is serving queries
+            return serving, False
+        if LocalVectorStore.exists(directory):
+            return load_local_store(embeddings, name), False
+        return LocalVectorStore(directory, embeddings, **LOCAL_INDEX_OPTIONS), True
+
+    client = get_qdrant_client()
+    created = False
+    if not client.collection_exists(name) and name not in list_qdrant_aliases(client):
+        vectors_config, quantization_config = qdrant_vector_params(embeddings.dimension, VECTOR_DTYPE)
+        client.create_collection(
+            collection_name=name,
+            vectors_config=vectors_config,
+            quantization_config=quantization_config
+        )
+        create_qdrant_payload_indexes(client, name)
+        created = True
+    store = QdrantStore(client=client, collection_name=name, embeddings=embeddings)
+    return store, created
+
+def load_local_store(embeddings, name=COLLECTION_NAME):
+    """Open a persisted in-process index without re-embedding."""
+    return LocalVectorStore.load(local_index_dir(name), embeddings, **LOCAL_INDEX_OPTIONS)
+
+def persist_store(store):
+    """Flush a store's pending writes to disk; the Qdrant service persists on its own."""
+    if isinstance(store, LocalVectorStore):
+        store.persist()
+
+def delete_points(store, point_ids, batch_size=1000):
+    """Delete the given point IDs from the store in batches."""
+    for i in range(0, len(point_ids), batch_size):
+        store.delete(point_ids[i:i+batch_size])
+    if point_ids:
+        logger.info(f"Deleted {len(point_ids)} stale points")
+
+def read_candidate(file_entry, manifest, file_filter, recheck=False):
+    """Hash and read one candidate file if it changed. Runs on the I/O thread pool.
+
+    Returns a FileResult whose status is 'unchanged', 'touched' (stat changed but
+    content did not), 'changed' (code is set), 'skipped' (``reason`` says why
+    the pre-filter left it out) or 'error'. With ``recheck`` indexed files are
+    read and put through the content checks again even if they did not change.
+    """
+    filepath, rel_path, stat_result = file_entry
+    try:
+        # Size and name limits are re-applied to unchanged files, so tightening them takes effect
+        reason = file_filter.check_path(rel_path, stat_result.st_size)
+        if reason:
+            return FileResult(rel_path, 'skipped', reason=reason)
+        if not recheck and manifest.is_unchanged(rel_path, stat_result):
+            return FileResult(rel_path, 'unchanged')
+
+        # Files are capped in size, so one read serves the hash, the checks and the split
+        with open(filepath, 'rb') as f:
+            data = f.read()
+        bytes_read.inc(len(data))
+        content_hash = data_hash(data)
+        entry = manifest.get(rel_path)
+        indexed = entry is not None and entry['hash'] == content_hash
+        if indexed and not recheck:
+            return FileResult(rel_path, 'touched', entry=(
+                content_hash, stat_result.st_mtime, stat_result.st_size, entry['point_ids']
+            ))
+
+        reason = file_filter.check_content(rel_path, data)
+        if reason:
+            return FileResult(rel_path, 'skipped', reason=reason)
+        if indexed:
+            return FileResult(rel_path, 'touched', entry=(
+                content_hash, stat_result.st_mtime, stat_result.st_size, entry['point_ids']
+            ))
+        try:
+            # Same newline handling as reading in text mode
+            code = data.decode('utf-8').replace('\r\n', '\n').replace('\r', '\n')
+        except UnicodeDecodeError:
+            return FileResult(rel_path, 'skipped', reason='undecodable')
+        return FileResult(rel_path, 'changed', code=code, entry=(
+            content_hash, stat_result.st_mtime, stat_result.st_size, None
+        ))
+    except Exception as e:
+        logger.error(f"Error reading file {rel_path}: {e}")
+        return FileResult(rel_path, 'error')
+
+def iter_file_results(file_entries, manifest, chunker, file_filter, read_pool, split_pool, recheck=False):
+    """Read and split repository files in parallel, yielding FileResults in walk order.
+
+    Reading runs on ``read_pool`` (threads), splitting on ``split_pool``
+    (processes, or inline when it is None). Results come back in the same order
+    as the walk, so chunk order and line metadata do not depend on scheduling.
+    """
+    window = INDEX_READ_WORKERS * 4
+
+    def submit_read(file_entry):
+        return read_pool.submit(read_candidate, file_entry, manifest, file_filter, recheck)
+
+    def submit_split(result):
+        if result.status != 'changed':
+            return completed_future(None)
+        if split_pool is None:
+            return completed_future(chunker.split(result.code, result.rel_path))
+        return split_pool.submit(split_in_worker, result.code, result.rel_path)
+
+    reads = (result for _, result in ordered_map(submit_read, file_entries, window))
+    for result, split in ordered_map(submit_split, reads, window):
+        if split is None:
+            yield result
+            continue
+        chunks, line_numbers = split
+        chunks_produced.inc(len(chunks))
+        content_hash, mtime, size, _ = result.entry
+        point_ids = [chunk_point_id(result.rel_path, i, content_hash) for i in range(len(chunks))]
+        fields = chunk_fields(result.rel_path)
+        metadatas = [{
+            "source": result.rel_path,
+            "line_start": line_nums['start'],
+            "line_end": line_nums['end'],
+            **fields
+        } for line_nums in line_numbers]
+        yield FileResult(
+            result.rel_path, 'changed', chunks=chunks, metadatas=metadatas,
+            point_ids=point_ids, entry=(content_hash, mtime, size, point_ids)
+        )
+
+def index_signature(chunker):
+    """Manifest signature: the chunking scheme plus the chunk metadata layout."""
+    return f"{chunker.signature}:meta-v{CHUNK_METADATA_VERSION}"
+
+def open_index(embeddings, chunker, name=COLLECTION_NAME):
+    """Open the vector store and lexical index together with the manifest describing them."""
+    manifest = IndexManifest(manifest_path(name), index_signature(chunker)).load()
+    store, created = open_vector_store(embeddings, name)
+    lexical = open_lexical(name)
+    if created and len(manifest):
+        # The collection was dropped behind our back; every entry is stale
+        logger.info("Collection was recreated, discarding stale manifest")
+        manifest.clear()
+        lexical.delete(list(lexical.docs))
+    return store, lexical, manifest
+
+def plan_changes(root, manifest, rel_paths, matcher):
+    """Turn a set of changed paths into (file_entries, removed_paths) for sync_files.
+
+    Returns None when a .gitignore changed, since that can add or drop files
+    anywhere below it and only a full scan re-applies the rules.
+    """
+    if any(os.path.basename(rel_path) == '.gitignore' for rel_path in rel_paths):
+        return None
+    file_entries, gone = resolve_paths(root, rel_paths, matcher)
+    found = {entry.rel_path for entry in file_entries}
+
+    def is_gone(path):
+        # A gone path may be a deleted or renamed directory; everything below it goes too
+        parts = path.split('/')
+        return any('/'.join(parts[:i]) in gone for i in range(1, len(parts) + 1))
+
+    removed_paths = [path for path in manifest.files if path not in found and is_gone(path)]
+    return file_entries, removed_paths
+
+def sync_files(file_entries, removed_paths, store, lexical, manifest, embeddings, chunker, file_filter,
+               progress, cancel_event=None, recheck=False):
+    """Bring the index up to date for the given files.
+
+    New and changed files are embedded, touched files only have their
+    manifest entry refreshed, and the files in ``removed_paths`` are
+    deleted, as are indexed files that ``file_filter`` now skips. With
+    ``removed_paths=None`` the entries are the whole repository, and every
+    manifest path missing from them is deleted. ``recheck`` re-applies the
+    content checks to indexed files, for when the limits changed.
+
+    Once ``cancel_event`` is set the files committed so far are checkpointed
+    and JobCancelled is raised; the next run picks up from there.
+    """
+    stale_ids = []
+
+    def upsert(batch_texts, batch_metadatas, batch_ids):
+        # Vectors go to the store as one float32 array, never as Python lists.
+        # Jobs for other repositories queue for the model between batches.
+        with embed_slots, embed_seconds.time():
+            vectors = embeddings.embed_documents_array(batch_texts)
+        embed_batches.inc()
+        with upsert_seconds.time():
+            store.add_vectors(vectors, batch_texts, batch_metadatas, batch_ids)
+            lexical.add(batch_ids, batch_texts, batch_metadatas)
+        chunks_embedded.inc(len(batch_texts))
+        progress['chunks_indexed'] = batcher.chunks_written + len(batch_texts)
+        progress['cache_hit_rate'] = embeddings.cache.hit_rate
+
+    def commit_file(rel_path, entry):
+        # Runs once all of the file's new points are written. IDs are derived from
+        # the content hash, so a re-chunked file may reuse some; those stay.
+        new_ids = set(entry[3])
+        stale_ids.extend(i for i in manifest.remove(rel_path) if i not in new_ids)
+        manifest.set(rel_path, *entry)
+
+    def checkpoint():
+        with checkpoint_seconds.time():
+            delete_points(store, stale_ids)
+            lexical.delete(stale_ids)
+            stale_ids.clear()
+            persist_store(store)
+            lexical.save()
+            manifest.save()
+            embeddings.cache.flush()
+
+    batcher = UpsertBatcher(upsert, batch_size=EMBED_BATCH_SIZE, on_file_complete=commit_file)
+    seen_paths = set()
+    last_checkpoint = 0
+    cancelled = False
+
+    # Walk -> read (threads) -> split (processes) runs in a producer thread
+    # while this thread embeds and upserts fixed-size batches
+    split_pool = get_split_pool(chunker, len(file_entries))
+    try:
+        with ThreadPoolExecutor(max_workers=INDEX_READ_WORKERS) as read_pool:
+            file_results = iter_in_background(
+                iter_file_results(file_entries, manifest, chunker, file_filter, read_pool, split_pool, recheck),
+                maxsize=PIPELINE_QUEUE_SIZE
+            )
+            for result in file_results:
+                seen_paths.add(result.rel_path)
+                progress.file_done(result.rel_path)
+                files_scanned.inc()
+                progress['message'] = (
+                    f"Processing {result.rel_path}... "
+                    f"({progress.get('chunks_indexed', 0)} chunks embedded, "
+                    f"{progress.get('cache_hit_rate', 0.0):.0%} from cache)"
+                )
+                if result.status == 'error':
+                    continue
+                if result.status == 'skipped':
+                    progress.file_skipped(result.rel_path, result.reason)
+                    files_skipped.labels(result.reason).inc()
+                    # Indexed before the file grew past a limit (or before the limits existed)
+                    stale_ids.extend(manifest.remove(result.rel_path))
+                    continue
+                if result.status == 'touched':
+                    # Touched but not modified: refresh the stat, keep the vectors
+                    manifest.set(result.rel_path, *result.entry)
+                elif result.status == 'changed':
+                    batcher.add_file(result.rel_path, result.chunks, result.metadatas,
+                                     result.point_ids, result.entry)
+
+                if batcher.batches_written - last_checkpoint >= CHECKPOINT_EVERY_BATCHES:
+                    checkpoint()
+                    last_checkpoint = batcher.batches_written
+                if cancel_event is not None and cancel_event.is_set():
+                    cancelled = True
+                    file_results.close()
+                    break
+    except BrokenProcessPool:
+        # A split worker died; the pool cannot be used again
+        discard_split_pool(chunker)
+        raise
+    if cancelled:
+        # Buffered files were never committed to the manifest and are redone next time
+        checkpoint()
+        raise JobCancelled(f"Cancelled after {progress['current']} files")
+    batcher.flush()
+
+    if removed_paths is None:
+        removed_paths = [path for path in list(manifest.files) if path not in seen_paths]
+    for rel_path in removed_paths:
+        stale_ids.extend(manifest.remove(rel_path))
+    checkpoint()
+
+    logger.info(
+        f"Indexing complete: {batcher.chunks_written} chunks embedded in "
+        f"{batcher.batches_written} batches ({embeddings.cache.hit_rate:.0%} cache hits), "
+        f"{len(removed_paths)} files removed, skipped {progress['skipped'] or 'none'}"
+    )
+    return batcher.chunks_written, len(removed_paths)
 
 # Move all the indexing code into a function
-def initialize_search(settings=None):
-    """Initialize the search index with the given settings."""
-    global indexing_progress
-    
-    # Use provided settings or defaults
-    settings = settings or DEFAULT_SETTINGS
+def initialize_search(repo, rebuild=False, cancel_event=None):
+    """Initialize the search index of a repository with its settings.
+
+    Indexes are updated in place when only some files changed. A first build,
+    a chunking change or ``rebuild`` writes a fresh build instead, which
+    replaces the served index in one step once it is complete.
+    """
+    settings = repo.settings
+    progress = repo.progress
     
     try:
-        logger.info("Starting indexing process...")
-        indexing_progress['status'] = 'indexing'
-        indexing_progress['phase'] = 'files'  # Explicitly set phase
-        logger.info(f"Current phase: {indexing_progress['phase']}")
+        logger.info(f"Starting indexing process for {repo.name}...")
+        progress['phase'] = 'scanning'
         
         # Validate repository path exists
-        if not os.path.exists(repo_path):
+        if not os.path.exists(repo.path):
             error_msg = (
-                f"Repository path '{repo_path}' does not exist. "
+                f"Repository path '{repo.path}' does not exist. "
                 f"This may be due to incorrect volume mapping in docker-compose.yml. "
                 f"Please check that your volume mapping includes both the host path "
                 f"AND the container path (e.g., '/path/on/host:/app/repo')."
@@ -158,197 +984,159 @@ def initialize_search(settings=None):
             logger.error(error_msg)
             raise ValueError(error_msg)
             
-        # Validate repository has indexable content
-        indexing_progress['message'] = 'Validating repository content...'
-        has_indexable_files = False
-        
-        # Check first level directories to make sure we have something to index
-        for root, dirs, files in os.walk(repo_path, topdown=True):
-            # Skip unwanted directories
-            dirs[:] = [d for d in dirs if not should_skip_directory(d, settings['skip_dirs'])]
-            
-            # Check if there are valid files at this level
-            valid_files = [f for f in files if f.endswith(tuple(settings['file_patterns']))]
-            if valid_files:
-                has_indexable_files = True
-                break
-                
-            # Only check the first level directories to avoid a full scan
-            if root != repo_path:
-                for d in dirs:
-                    # Just check if there are any potential indexable files
-                    subdir = os.path.join(root, d)
-                    subdir_files = os.listdir(subdir)
-                    if any(f.endswith(tuple(settings['file_patterns'])) for f in subdir_files):
-                        has_indexable_files = True
-                        break
-                
-            # If we found files, we can stop checking
-            if has_indexable_files:
-                break
-                
-        if not has_indexable_files:
-            error_msg = (
-                "No indexable files found in the repository. "
-                "This could be due to one of the following reasons:\n"
-                "1. The repository directory is empty\n"
-                "2. The volume mapping in docker-compose.yml is incorrect\n"
-                "3. Your repository doesn't contain files with the extensions specified in settings\n\n"
-                "Please check your docker-compose.yml file and ensure the volume mapping is correctly specified "
-                "as '/path/on/host:/app/repo'. Also verify that your repository contains files with the configured extensions."
+        embeddings = get_shared_embeddings()
+        embeddings.cache.reset_stats()
+        chunker = CodeChunker(max_chars=CHUNK_MAX_CHARS)
+        matcher = IgnoreMatcher(settings['skip_dirs'], settings['file_patterns'])
+
+        # Git checkouts get one snapshot per branch, diffed against the commit it last indexed
+        commit = head_commit(repo.path)
+        name = index_name(repo, current_branch(repo.path)) if commit else repo.collection
+        if name != repo.active_index and not collection_exists(name) and collection_exists(repo.active_index):
+            progress['message'] = 'Creating branch snapshot...'
+            copy_index(repo.active_index, name)
+        manifest = IndexManifest(manifest_path(name), index_signature(chunker)).load()
+        version = None
+        # Indexes from before the lexical index existed are rebuilt once to get one
+        if (rebuild or manifest.rechunk or not len(manifest) or not collection_exists(name)
+                or not LexicalIndex.exists(lexical_path(name))):
+            # Blue/green: build into a new collection while the current one keeps serving
+            version = new_index_version(name)
+            logger.info(f"Building {name} from scratch into {version}")
+            store, _ = open_vector_store(embeddings, version)
+            lexical = LexicalIndex(lexical_path(version))
+            manifest = IndexManifest(f"{manifest_path(name)}.next", index_signature(chunker))
+        else:
+            store, lexical, manifest = open_index(embeddings, chunker, name)
+
+        digest = selection_digest(settings)
+        changed = changed_since(repo.path, manifest.commit) if commit and not version else None
+        # Indexed files may have just been excluded or limited, and git reports none of them
+        recheck = manifest.settings != digest and len(manifest) > 0
+        if recheck:
+            logger.info(f"File selection settings of {repo.name} changed, re-checking every file")
+            changed = None
+        plan = None
+        if changed is not None:
+            # Files dirty at the last run may since have been reverted to the commit
+            plan = plan_changes(repo.path, manifest, changed | set(manifest.dirty), matcher)
+        if plan is not None:
+            file_entries, removed_paths = plan
+            logger.info(
+                f"Git delta since {manifest.commit[:12]}: {len(file_entries)} files to check, "
+                f"{len(removed_paths)} files removed"
             )
-            logger.error(error_msg)
-            raise ValueError(error_msg)
-        
-        embeddings = SentenceTransformerEmbeddings()
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=2000,
-            chunk_overlap=200,
-            separators=["\n\n", "\n", " ", ""]
-        )
+        else:
+            # Walk the repository once; validation, counting and processing share the list
+            progress['message'] = 'Scanning repository...'
+            logger.info(f"Starting file scan from: {repo.path}")
+            file_entries = scan_repository(repo.path, matcher)
 
-        # First pass to count files
-        indexing_progress['message'] = 'Counting files...'
-        total_files = 0
-        logger.info(f"Starting file scan from: {repo_path}")
-        for root, dirs, files in os.walk(repo_path):
-            # Skip unwanted directories
-            dirs[:] = [d for d in dirs if not should_skip_directory(d, settings['skip_dirs'])]
-            
-            # Log files being counted
-            valid_files = [f for f in files if f.endswith(tuple(settings['file_patterns']))]
-            total_files += len(valid_files)
+            if not file_entries:
+                error_msg = (
+                    "No indexable files found in the repository. "
+                    "This could be due to one of the following reasons:\n"
+                    "1. The repository directory is empty\n"
+                    "2. The volume mapping in docker-compose.yml is incorrect\n"
+                    "3. Your repository doesn't contain files with the extensions specified in settings\n\n"
+                    "Please check your docker-compose.yml file and ensure the volume mapping is correctly specified "
+                    "as '/path/on/host:/app/repo'. Also verify that your repository contains files with the configured extensions."
+                )
+                logger.error(error_msg)
+                raise ValueError(error_msg)
+            removed_paths = None
+        total_files = len(file_entries)
 
         logger.info(f"Total files to process: {total_files}")
         
-        indexing_progress['total'] = total_files
-        indexing_progress['current'] = 0
-        indexing_progress['message'] = 'Processing files...'
-        indexing_progress['indexed_files'] = []
+        progress.begin_files(total_files)
+        progress['phase'] = 'files'
+        progress['message'] = 'Processing files...'
 
-        texts = []
-        metadatas = []
-        
-        # Process files with progress
-        for root, dirs, files in os.walk(repo_path):
-            dirs[:] = [d for d in dirs if not should_skip_directory(d, settings['skip_dirs'])]
-            
-            for file in files:
-                if file.endswith(tuple(settings['file_patterns'])):
-                    filepath = os.path.join(root, file)
-                    rel_path = os.path.relpath(filepath, repo_path)
-                    
-                    indexing_progress['message'] = f'Processing {rel_path}...'
-                    indexing_progress['current'] += 1
-                    
-                    try:
-                        with open(filepath, "r", encoding="utf-8") as f:
-                            code = f.read()
-                            chunks = text_splitter.split_text(code)
-                            # Calculate line numbers for each chunk
-                            line_numbers = []
-                            current_line = 1
-                            for chunk in chunks:
-                                chunk_lines = chunk.count('\n') + 1
-                                line_numbers.append({
-                                    'start': current_line,
-                                    'end': current_line + chunk_lines - 1
-                                })
-                                current_line += chunk_lines
-
-                            texts.extend(chunks)
-                            metadatas.extend([{
-                                "source": rel_path,
-                                "line_start": line_nums['start'],
-                                "line_end": line_nums['end']
-                            } for line_nums in line_numbers])
-                            indexing_progress['indexed_files'].append(rel_path)
-                    except Exception as e:
-                        logger.error(f"Error reading file {rel_path}: {e}")
-
-        logger.info("File processing complete, starting vector creation...")
-        indexing_progress.update({
-            'phase': 'vectors',
-            'message': VECTOR_MESSAGES[0],
-            'message_index': 0,
-            'message_count': 0,
-            'current': 0,
-            'total': len(texts)
-        })
-        
-        # Process texts in batches to show progress
-        batch_size = 100
-        processed_texts = []
-        processed_metadatas = []
-        
-        for i in range(0, len(texts), batch_size):
-            batch_texts = texts[i:i+batch_size]
-            batch_metadatas = metadatas[i:i+batch_size]
-            
-            # Update progress
-            indexing_progress.update({
-                'current': i,
-                'total': len(texts),
-                'message': VECTOR_MESSAGES[indexing_progress.get('message_index', 0)]
-            })
-            logger.info(f"Processing vectors batch: {i}/{len(texts)}")
-            
-            # Process batch
-            processed_texts.extend(batch_texts)
-            processed_metadatas.extend(batch_metadatas)
-        
-        # Create the final vector store
-        result = Qdrant.from_texts(
-            processed_texts,
-            embeddings,
-            metadatas=processed_metadatas,
-            location="http://vectorstore:6333",
-            collection_name="code_chunks",
-            prefer_grpc=False,
-            timeout=60
-        )
-        
-        return result
+        # Batches are searchable as soon as they are written, so expose the store right away
+        if repo.docsearch is None:
+            repo.docsearch, repo.lexical_index = store, lexical
+            repo.active_index = name
+
+        dirty = changed_since(repo.path, commit) if commit else None
+        try:
+            sync_files(file_entries, removed_paths, store, lexical, manifest, embeddings, chunker,
+                       make_file_filter(settings), progress, cancel_event, recheck)
+        except Exception:
+            if version:
+                # The served index was never touched; just throw the partial build away
+                if repo.docsearch is store:
+                    repo.docsearch, repo.lexical_index = None, None
+                drop_physical_index(version)
+            raise
+        if commit:
+            # Whatever differs from the commit, before or after this run, is re-checked next time
+            manifest.commit = commit
+            manifest.dirty = sorted((dirty or set()) | (changed_since(repo.path, commit) or set()))
+        # Only recorded once every file has been checked against the settings
+        manifest.settings = digest
+        manifest.save()
+
+        if version:
+            progress['phase'] = 'publishing'
+            progress['message'] = 'Switching to the new index...'
+            publish_index(name, version)
+            os.replace(manifest.path, manifest_path(name))
+            lexical.path = lexical_path(name)
+            if VECTOR_BACKEND != 'local':
+                # Serve through the alias so the next rebuild can switch it
+                store, _ = open_vector_store(embeddings, name)
+
+        repo.active_index = name
+        save_active_index(repo, name)
+        return store, lexical
         
     except Exception as e:
-        indexing_progress['status'] = 'error'
-        indexing_progress['message'] = str(e)
+        progress['status'] = 'error'
+        progress['message'] = str(e)
         raise
 
-def background_reindex():
-    """Run reindexing in a background thread."""
-    global docsearch, indexing_progress
+def background_reindex(repo, rebuild=False, cancel_event=None):
+    """Reindex a repository; runs on a job scheduler worker."""
+    progress = repo.progress
+    query_cache.invalidate()
     try:
         # Reset everything at start
-        indexing_progress.update({
-            'phase': 'files',
-            'status': 'processing',
-            'message': 'Processing files...',
-            'current': 0,
-            'total': 0,
-            'indexed_files': []
-        })
+        progress.start(phase='scanning', status='processing', message='Scanning repository...')
         
-        # Clear existing index first
-        response = requests.delete("http://vectorstore:6333/collections/code_chunks")
-        if response.status_code != 200:
-            raise Exception(f"Failed to clear index: {response.status_code}")
-        
-        # Initialize search with thread safety
-        with docsearch_lock:
-            docsearch = initialize_search(DEFAULT_SETTINGS)
+        # Update the index in place, or build a replacement when a rebuild is needed.
+        # Watcher updates wait for the full pass; queries keep using the current
+        # store and only the final swap takes the docsearch lock
+        with repo.indexing_lock:
+            store, lexical = initialize_search(repo, rebuild=rebuild, cancel_event=cancel_event)
+        with repo.docsearch_lock:
+            repo.docsearch, repo.lexical_index = store, lexical
+        # Only once the new snapshot is served, so no query is left on a dropped one
+        with repo.indexing_lock:
+            try:
+                prune_branch_snapshots(repo)
+            except Exception as e:
+                logger.warning(f"Could not prune branch snapshots of {repo.name}: {e}")
         
         # Mark as complete
-        indexing_progress.update({
+        progress.finish(**{
             'phase': 'complete',
             'status': 'complete',
             'message': 'Indexing complete'
         })
         
+    except JobCancelled as e:
+        logger.info(f"Reindex of {repo.name} cancelled: {e}")
+        progress.finish(**{
+            'status': 'cancelled',
+            'phase': 'cancelled',
+            'message': 'Indexing cancelled; files indexed so far are kept'
+        })
+        raise
     except ValueError as e:
         # Handle validation errors (like missing repo or no files)
         logger.error(f"Validation error during reindex: {e}")
-        indexing_progress.update({
+        progress.finish(**{
             'status': 'error',
             'phase': 'error',
             'message': str(e)
@@ -366,138 +1154,498 @@ def background_reindex():
                 "AND the container path (e.g., '/path/on/host:/app/repo')."
             )
             logger.error(error_msg)
-            indexing_progress.update({
+            progress.finish(**{
                 'status': 'error',
                 'phase': 'error',
                 'message': error_msg
             })
         else:
-            indexing_progress.update({
+            progress.finish(**{
                 'status': 'error',
                 'phase': 'error',
                 'message': str(e)
             })
+    finally:
+        # Results cached before or during the run may reference replaced chunks
+        query_cache.invalidate()
+
+def run_index_job(job):
+    """Scheduler entry point: reindex (or rebuild) the job's repository."""
+    repo = repositories[job.repo]
+    background_reindex(repo, rebuild=job.kind == 'rebuild', cancel_event=job.cancel_event)
+    if repo.progress['status'] == 'error':
+        raise RuntimeError(repo.progress['message'])
+
+scheduler = JobScheduler(run_index_job, max_workers=JOB_WORKERS)
+
+def apply_watched_changes(repo, rel_paths):
+    """Incrementally index the files behind a batch of watcher events.
+
+    Runs on the repository's watcher thread. Queries keep using the live store
+    while the batch is written; only full reindexes and other batches are excluded.
+    """
+    settings = repo.settings
+    if repo.docsearch is None:
+        logger.info(f"No index of {repo.name} yet, ignoring file changes until the first reindex")
+        return
+
+    if head_commit(repo.path) and index_name(repo, current_branch(repo.path)) != repo.active_index:
+        # A checkout switched branches: swap to (or create) that branch's snapshot
+        logger.info(f"Branch of {repo.name} changed, switching index snapshot")
+        scheduler.submit(repo.name)
+        return
+
+    matcher = IgnoreMatcher(settings['skip_dirs'], settings['file_patterns'])
+    with repo.indexing_lock:
+        embeddings = get_shared_embeddings()
+        chunker = CodeChunker(max_chars=CHUNK_MAX_CHARS)
+        store, lexical, manifest = open_index(embeddings, chunker, repo.active_index)
+
+        plan = plan_changes(repo.path, manifest, rel_paths, matcher)
+        if plan is None:
+            file_entries, removed_paths = scan_repository(repo.path, matcher), None
+        else:
+            file_entries, removed_paths = plan
+            if not file_entries and not removed_paths:
+                return
+
+        progress = IndexingProgress()
+        progress.start(status='processing')
+        chunks, removed = sync_files(
+            file_entries, removed_paths, store, lexical, manifest, embeddings, chunker,
+            make_file_filter(settings), progress
+        )
+        query_cache.invalidate()
+        logger.info(
+            f"Watcher applied {progress['current']} files of {repo.name} ({chunks} chunks embedded), "
+            f"{removed} files removed"
+        )
+
+def start_watcher(repo):
+    """Keep a repository's index in step with its working tree from a background watcher."""
+    settings = repo.settings
+    repo.watcher = RepositoryWatcher(
+        repo.path,
+        lambda rel_paths: apply_watched_changes(repo, rel_paths),
+        matcher_factory=lambda: IgnoreMatcher(settings['skip_dirs'], settings['file_patterns']),
+        debounce=WATCH_DEBOUNCE_SECONDS,
+        max_wait=WATCH_MAX_WAIT_SECONDS,
+        poll_interval=WATCH_POLL_INTERVAL,
+        backend=WATCH_BACKEND
+    ).start()
+    return repo.watcher
+
+def requested_repository():
+    """The repository named by the request's ``repo`` argument; 404s for an unknown name."""
+    repo = get_repository(request.values.get('repo', ''))
+    if repo is None:
+        abort(404, description=f"Unknown repository {request.values.get('repo')!r}")
+    return repo
 
 @app.route('/admin/reindex', methods=['POST'])
 def force_reindex():
-    """Force a reindex of the codebase."""
+    """Queue a reindex of a repository (the default one unless ``repo`` is given)."""
+    repo = requested_repository()
     try:
-        # Start background thread
-        thread = Thread(target=background_reindex)
-        thread.daemon = True
-        thread.start()
-        return redirect(url_for('show_progress'))
+        # A rebuild re-embeds everything into a fresh index
+        kind = 'rebuild' if request.form.get('rebuild') == '1' else 'reindex'
+        if scheduler.active(repo.name) is None:
+            # Shown until a worker picks the job up
+            repo.progress.update(status='queued', phase='queued', message='Waiting for an indexing worker...')
+        job, created = scheduler.submit(repo.name, kind)
+        if not created:
+            flash(f"A {job.kind} of {repo.name} is already queued", "success")
+        return redirect(url_for('show_progress', repo=repo.name))
     except Exception as e:
         logger.error(f"Error starting reindex: {e}")
         flash(f"Error starting reindex: {str(e)}", "error")
         return redirect(url_for('index'))
 
+@app.route('/admin/jobs')
+def list_jobs():
+    """Running, queued and recently finished indexing jobs."""
+    return jsonify(scheduler.jobs())
+
+@app.route('/admin/jobs/<int:job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    """Cancel a queued job, or ask a running one to stop after the file it is on."""
+    job = scheduler.cancel(job_id)
+    if job is None:
+        return jsonify({'error': 'No such active job'}), 404
+    progress = repositories[job.repo].progress
+    if job.state == 'cancelled' and progress['status'] == 'queued':
+        progress.finish(status='cancelled', phase='cancelled', message='Indexing cancelled before it started')
+    return jsonify(job.to_dict())
+
+@app.route('/admin/repos')
+def list_repositories():
+    """Configured repositories, what each is serving and its current job."""
+    repos = []
+    for repo in repositories.values():
+        job = scheduler.active(repo.name)
+        repos.append(dict(repo.describe(), job=job.to_dict() if job else None))
+    return jsonify(repos)
+
 @app.route('/admin/progress')
 def show_progress():
-    """Show the current indexing progress."""
+    """Show the current indexing progress of a repository."""
+    repo = requested_repository()
     is_ajax = request.headers.get('X-Requested-With') == 'XMLHttpRequest'
     
     if is_ajax:
-        # Rotate message if in vector phase
-        if indexing_progress['phase'] == 'vectors':
-            current_count = indexing_progress.get('message_count', 0)
-            if current_count % 20 == 0:  # Update message every 20th request
-                current_idx = indexing_progress.get('message_index', 0)
-                next_idx = (current_idx + 1) % len(VECTOR_MESSAGES)
-                indexing_progress['message'] = VECTOR_MESSAGES[next_idx]
-                indexing_progress['message_index'] = next_idx
-            indexing_progress['message_count'] = current_count + 1
-            
-        return jsonify({
-            'phase': indexing_progress['phase'],
-            'status': indexing_progress['status'],
-            'message': indexing_progress['message'],
-            'current': indexing_progress['current'],
-            'total': indexing_progress['total'],
-            'indexed_files': list(indexing_progress['indexed_files'])
-        })
+        return jsonify(repo.progress.snapshot())
     
-    return render_template('progress.html', indexing_progress=indexing_progress)
+    return render_template(
+        'progress.html',
+        repo=repo.name,
+        indexing_progress=repo.progress.snapshot(),
+        recent_files=repo.progress.files_since(limit=20)['files']
+    )
+
+def file_feed(progress, run, cursor, limit):
+    """Files processed since ``cursor``; a cursor from an earlier run starts over."""
+    if run != progress.run:
+        cursor = 0 if cursor is not None else None
+    return progress.files_since(cursor, limit)
+
+@app.route('/admin/progress/files')
+def progress_files():
+    """Incremental feed of processed files: pass back ``run`` and ``cursor`` from the last response."""
+    return jsonify(file_feed(
+        requested_repository().progress,
+        request.args.get('run', type=int),
+        request.args.get('cursor', type=int),
+        min(request.args.get('limit', 500, type=int), 5000)
+    ))
+
+@app.route('/admin/progress/skipped')
+def progress_skipped():
+    """Files the pre-filter left out of the current (or last) run, with the reason for each."""
+    progress = requested_repository().progress
+    return jsonify({
+        'run': progress.run,
+        'counts': progress.snapshot()['skipped'],
+        'files': progress.skipped_files()
+    })
+
+@app.route('/admin/progress/stream')
+def progress_stream():
+    """Server-sent events: 'progress' snapshots when they change and 'files' batches, until the run ends."""
+    progress = requested_repository().progress
+    run = request.args.get('run', type=int)
+    cursor = request.args.get('cursor', type=int)
+
+    def events():
+        nonlocal run, cursor
+        last = None
+        while True:
+            done = progress.done or progress['status'] != 'processing'
+            feed = file_feed(progress, run, cursor, 500)
+            run, cursor = feed['run'], feed['cursor']
+            if feed['files'] or feed['skipped']:
+                yield f"event: files\ndata: {json.dumps(feed)}\n\n"
+            snapshot = progress.snapshot()
+            if snapshot != last:
+                yield f"event: progress\ndata: {json.dumps(snapshot)}\n\n"
+                last = snapshot
+            if done and not feed['files']:
+                return
+            time.sleep(PROGRESS_STREAM_INTERVAL)
+
+    return Response(events(), mimetype='text/event-stream', headers={'Cache-Control': 'no-cache'})
+
+@app.route('/metrics')
+def show_metrics():
+    """Indexing and search metrics in the Prometheus text format."""
+    # The indexing gauges sum the runs in progress across repositories
+    snapshots = [repo.progress.snapshot() for repo in repositories.values()]
+    running = [p for p in snapshots if p['status'] == 'processing'] or snapshots
+    indexing_files_total.set(sum(p['total'] for p in running))
+    indexing_files_done.set(sum(p['current'] for p in running))
+    indexing_chunks_per_second.set(sum(p['chunks_per_second'] for p in running))
+    indexing_eta_seconds.set(max((p['eta_seconds'] or 0 for p in running), default=0))
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
 
 @app.route('/')
 def index():
-    return render_template('index.html', docsearch=docsearch is not None)
+    return render_template(
+        'index.html',
+        docsearch=any(repo.docsearch is not None for repo in repositories.values()),
+        repositories=list(repositories),
+        selected_repo=''
+    )
+
+def fuse_results(store, vector_runs, lexical_hits, k):
+    """Reciprocal rank fusion of vector hit lists and BM25 hits; returns [(doc, fused score)]."""
+    by_id = {}
+    rankings = []
+    for docs in vector_runs:
+        rankings.append([doc.metadata.get('_id') for doc, _ in docs])
+        by_id.update((doc.metadata.get('_id'), doc) for doc, _ in docs)
+    rankings.append([pid for pid, _ in lexical_hits])
+    fused = reciprocal_rank_fusion(rankings, k=RRF_K)[:k]
+    # Chunks only the lexical index found are fetched from the store by ID
+    missing = [pid for pid, _ in fused if pid not in by_id]
+    for doc in store.get_documents(missing):
+        by_id[doc.metadata['_id']] = doc
+    return [(by_id[pid], score) for pid, score in fused if pid in by_id]
+
+def search_code(repo, query, k=SEARCH_K, filters=(), priority_paths=()):
+    """Run a hybrid (vector + BM25) search of one repository and return display-ready results, using the query cache.
+
+    ``filters`` (from parse_filters) are applied inside the vector store and
+    the lexical index, so a filtered query still returns up to ``k`` hits.
+    Chunks under ``priority_paths`` get an extra ranking in the fusion.
+    """
+    queries_total.inc()
+    priority = tuple(p.strip('/') for p in priority_paths if p.strip('/'))
+    # The identifier path depends on letter case, which the cache key drops
+    identifier = LEXICAL_SEARCH and is_identifier_query(query)
+    result_key = query_cache.result_key(query, k, repo.name, filters, priority, identifier)
+    results = query_cache.results.get(result_key)
+    if results is not None:
+        logger.info(f"Serving cached results for query: {query!r}")
+        return results
+
+    # A reindex may swap docsearch mid-query; stay on the indexes we started with
+    store, lexical = repo.docsearch, repo.lexical_index if LEXICAL_SEARCH else None
+    docs = None
+    if lexical is not None and identifier:
+        # Identifier lookups are answered from the lexical index without running the model
+        with lexical_search_seconds.time():
+            hits = lexical.search(query, k, filters)
+        if hits:
+            scores = dict(hits)
+            docs = [(doc, scores[doc.metadata['_id']]) for doc in store.get_documents([pid for pid, _ in hits])]
+            logger.info(f"Answered identifier query from the lexical index: {len(docs)} results")
+
+    if docs is None:
+        vector_key = normalise_query(query)
+        query_vector = query_cache.vectors.get(vector_key)
+        if query_vector is None:
+            with query_embed_seconds.time():
+                query_vector = query_batcher.embed_query(query)
+            query_cache.vectors.put(vector_key, query_vector)
+
+        with vector_search_seconds.time():
+            vector_runs = [store.similarity_search_with_score_by_vector(query_vector, k=k, filter=filters or None)]
+        logger.info(f"Found {len(vector_runs[0])} initial results")
+        if priority:
+            # Boost priority paths with a second ranking restricted to them
+            boosted = filters + (('path_prefixes', priority),)
+            with vector_search_seconds.time():
+                vector_runs.append(store.similarity_search_with_score_by_vector(query_vector, k=k, filter=boosted))
+        if lexical is not None or priority:
+            lexical_hits = []
+            if lexical is not None:
+                with lexical_search_seconds.time():
+                    lexical_hits = lexical.search(query, k, filters)
+            docs = fuse_results(store, vector_runs, lexical_hits, k)
+        else:
+            # Vector-only search keeps its lenient score cut-off
+            docs = [(doc, score) for doc, score in vector_runs[0] if score < 0.5]
+    
+    # Prepare results with more relaxed filtering
+    results = []
+    seen = set()
+    for doc, score in docs:
+        content = doc.page_content.strip()
+        if content not in seen:
+            seen.add(content)
+            results.append({
+                'id': doc.metadata.get('_id'),
+                'filepath': doc.metadata.get('source', 'unknown'),
+                'raw_content': content,  # Highlighted per request, see highlight_results
+                'line_start': doc.metadata.get('line_start', 1),
+                'line_end': doc.metadata.get('line_end', 1),
+                'score': score
+            })
+    
+    logger.info(f"Reduced to {len(results)} unique results")
+
+    # While a reindex is writing, the index changes under us; don't pin those results
+    if repo.progress['status'] != 'processing':
+        query_cache.results.put(result_key, results)
+    return results
+
+def search_repositories(repos, query, k=SEARCH_K, filters=(), priority_paths=None):
+    """Search several repositories and merge their results into one list of up to ``k``.
+
+    Scores from different indexes are not comparable (BM25 statistics and
+    score cut-offs are per index), so the per-repository rankings are merged
+    by reciprocal rank fusion. Each result carries the name of its ``repo``.
+    ``priority_paths=None`` uses each repository's own setting.
+    """
+    rankings = []
+    by_key = {}
+    for repo in repos:
+        if repo.docsearch is None:
+            continue
+        priority = repo.settings.get('priority_paths', []) if priority_paths is None else priority_paths
+        results = search_code(repo, query, k=k, filters=filters, priority_paths=priority)
+        rankings.append([(repo.name, result['id']) for result in results])
+        by_key.update(((repo.name, result['id']), dict(result, repo=repo.name)) for result in results)
+    if len(rankings) == 1:
+        return [by_key[key] for key in rankings[0]]
+    return [by_key[key] for key, _ in reciprocal_rank_fusion(rankings, k=RRF_K)[:k]]
+
+def highlight_snippet(code, path, line_start):
+    with highlight_seconds.time():
+        return highlighter.render(code, path, line_start)
+
+def highlight_results(results):
+    """Copies of the results with highlighted HTML in ``content``."""
+    return [dict(result, content=highlight_snippet(
+        result['raw_content'], result['filepath'], result['line_start']
+    )) for result in results]
+
+def requested_repositories(value):
+    """Repositories for a ``repo`` query argument: one name, a comma-separated list, or '*' for all."""
+    if value.strip() == '*':
+        return list(repositories.values())
+    names = [name.strip() for name in value.split(',') if name.strip()]
+    if not names:
+        return [default_repository()]
+    unknown = [name for name in names if name not in repositories]
+    if unknown:
+        abort(404, description=f"Unknown repository {', '.join(unknown)}")
+    return [repositories[name] for name in dict.fromkeys(names)]
 
 @app.route('/query', methods=['GET'])
 def query():
     query = request.args.get('query', '')
     if not query:
         return redirect(url_for('index'))
-    if docsearch is None:
+    repo_arg = request.args.get('repo', '')
+    repos = requested_repositories(repo_arg)
+    if all(repo.docsearch is None for repo in repos):
         flash("No index available. Please index your codebase first.", "error")
         return redirect(url_for('index'))
+    filter_args = {name: request.args.get(name, '') for name in ('path', 'ext', 'lang')}
+    filters = parse_filters(**filter_args)
+    # Priority paths saved on the settings page apply to every repository searched
+    priority_paths = session['settings'].get('priority_paths', []) if 'settings' in session else None
     try:
-        # Remove the forced JWT context
-        docs = docsearch.similarity_search_with_score(query, k=10)
-        logger.info(f"Found {len(docs)} initial results")
-        
-        # Prepare results with more relaxed filtering
-        results = []
-        seen = set()
-        for doc, score in docs:
-            if score < 0.5:  # Adjust threshold to be more lenient
-                content = doc.page_content.strip()
-                if content not in seen:
-                    seen.add(content)
-                    formatted_content = format_code_for_display(
-                        content, 
-                        'php',  # You might want to detect language from file extension
-                        line_start=doc.metadata.get('line_start', 1)
-                    )
-                    results.append({
-                        'filepath': doc.metadata.get('source', 'unknown'),
-                        'content': formatted_content,
-                        'raw_content': content,  # Store the unformatted code
-                        'line_start': doc.metadata.get('line_start', 1),
-                        'line_end': doc.metadata.get('line_end', 1),
-                        'score': score
-                    })
-        
-        logger.info(f"Reduced to {len(results)} unique results")
-        
-        if not results:
-            results = [{
-                'filepath': 'No results',
-                'content': 'No relevant code found for your query.',
-                'score': 0
-            }]
-            
-        return render_template('results.html', query=query, results=results[:5])
+        with query_seconds.time():
+            results = search_repositories(repos, query, filters=filters, priority_paths=priority_paths)
+            lazy = request.args.get('lazy', '1' if LAZY_HIGHLIGHT else '0') == '1'
+            if not lazy:
+                results = highlight_results(results)
+
+            if not results:
+                results = [{
+                    'filepath': 'No results',
+                    'content': 'No relevant code found for your query.',
+                    'score': 0
+                }]
+
+            return render_template(
+                'results.html', query=query, results=results, filters=filter_args,
+                repositories=list(repositories), selected_repo=repo_arg, show_repo=len(repos) > 1
+            )
     except Exception as e:
         logger.error(f"Error processing query: {e}")
         logger.error(f"Error details: {str(e)}")
         return "Error processing query", 500
 
-def collection_exists():
+@app.route('/highlight')
+def highlight_chunk():
+    """Highlighted HTML for one indexed chunk, for results rendered without it."""
+    store = requested_repository().docsearch
+    point_id = request.args.get('id', '')
+    if store is None or not point_id:
+        return jsonify({'error': 'Not found'}), 404
+    docs = store.get_documents([point_id])
+    if not docs:
+        return jsonify({'error': 'Not found'}), 404
+    doc = docs[0]
+    html = highlight_snippet(
+        doc.page_content.strip(), doc.metadata.get('source', ''), doc.metadata.get('line_start', 1)
+    )
+    return jsonify({'id': point_id, 'html': html})
+
+def collection_exists(name):
+    if VECTOR_BACKEND == 'local':
+        return LocalVectorStore.exists(local_index_dir(name))
     try:
         # Try to get collection info - will raise exception if doesn't exist
-        response = requests.get("http://vectorstore:6333/collections/code_chunks")
+        response = get_http_session().get(f"{VECTORSTORE_URL}/collections/{name}")
         logger.info(f"Collection check response: {response.status_code}")
         logger.info(f"Collection info: {response.json()}")
-        return response.status_code == 200
+        if response.status_code == 200:
+            return True
+        # Index names are usually aliases of a versioned collection
+        response = get_http_session().get(f"{VECTORSTORE_URL}/aliases")
+        aliases = response.json().get('result', {}).get('aliases', []) if response.ok else []
+        return any(alias.get('alias_name') == name for alias in aliases)
     except Exception as e:
         logger.error(f"Error checking collection: {e}")
         return False
 
-def clear_index():
+def owned_files(repo, directory, suffix):
+    """Paths of the files in ``directory`` named after one of the repository's indexes."""
+    if not os.path.isdir(directory):
+        return []
+    return [
+        os.path.join(directory, filename) for filename in os.listdir(directory)
+        if filename.endswith(suffix) and repo.owns(filename[:-len(suffix)])
+    ]
+
+def clear_index(repo):
+    """Remove every index snapshot of a repository together with its manifests."""
     try:
-        response = requests.delete("http://vectorstore:6333/collections/code_chunks")
-        return response.status_code == 200
+        # Without its points the manifest is meaningless; the next index is a full build
+        if repo.owns(COLLECTION_NAME):
+            IndexManifest(MANIFEST_PATH).clear()
+        manifests_dir = os.path.join(INDEX_DATA_DIR, 'manifests')
+        for path in owned_files(repo, manifests_dir, '.json') + owned_files(repo, manifests_dir, '.json.next'):
+            os.remove(path)
+        for path in owned_files(repo, LEXICAL_INDEX_DIR, '.json'):
+            os.remove(path)
+        if VECTOR_BACKEND == 'local':
+            if isinstance(repo.docsearch, LocalVectorStore):
+                repo.docsearch.clear()
+            if os.path.isdir(LOCAL_INDEX_ROOT):
+                for name in os.listdir(LOCAL_INDEX_ROOT):
+                    if repo.owns(name.removesuffix('.tmp')):
+                        path = local_index_dir(name)
+                        if os.path.islink(path):
+                            os.remove(path)
+                        else:
+                            shutil.rmtree(path, ignore_errors=True)
+            return True
+        ok = True
+        # Dropping a collection drops the aliases pointing at it
+        for name in list_physical_indexes():
+            if repo.owns(name):
+                response = get_http_session().delete(f"{VECTORSTORE_URL}/collections/{name}")
+                ok = ok and response.status_code == 200
+        return ok
     except Exception as e:
-        logger.error(f"Failed to clear index: {e}")
+        logger.error(f"Failed to clear index of {repo.name}: {e}")
         return False
 
 @app.route('/admin/clear', methods=['POST'])
 def admin_clear_index():
-    global docsearch
+    """Clear the named repository's indexes, or every repository's without ``repo``."""
     try:
-        if clear_index():
-            docsearch = None
+        name = request.form.get('repo', '')
+        repos = [requested_repository()] if name else list(repositories.values())
+        ok = True
+        for repo in repos:
+            if scheduler.active(repo.name) is not None:
+                flash(f"{repo.name} is being indexed; cancel its job before clearing it", "error")
+                ok = False
+                continue
+            with repo.indexing_lock:
+                if clear_index(repo):
+                    with repo.docsearch_lock:
+                        repo.docsearch, repo.lexical_index = None, None
+                    repo.active_index = repo.collection
+                else:
+                    ok = False
+        query_cache.invalidate()
+        if ok:
             flash("Index cleared successfully", "success")
         else:
             flash("Error clearing index", "error")
@@ -507,6 +1655,149 @@ def admin_clear_index():
         flash(f"Error clearing index: {str(e)}", "error")
         return redirect(url_for('index'))
 
+def export_snapshot(repo, path, dtype=SNAPSHOT_DTYPE):
+    """Write the index a repository is serving to a snapshot file at ``path``; returns its header."""
+    with repo.indexing_lock:
+        if repo.docsearch is None:
+            raise ValueError(f"{repo.name} has no index to export")
+        embeddings = get_shared_embeddings()
+        persist_store(repo.docsearch)
+        source = manifest_path(repo.active_index)
+        header = {
+            'model': embeddings.model_name,
+            'dimension': embeddings.dimension,
+            'repository': repo.name,
+            'index': repo.active_index,
+            'signature': index_signature(CodeChunker(max_chars=CHUNK_MAX_CHARS)),
+            'commit': IndexManifest(source).load().commit
+        }
+        return write_snapshot(path, repo.docsearch, source, header, dtype=dtype)
+
+def import_snapshot(repo, path):
+    """Load a snapshot file into a fresh build of the repository's index and serve it.
+
+    Nothing is embedded: vectors are upserted as stored and the lexical index is
+    rebuilt from the chunk texts. The build replaces the served index in one
+    step, like a rebuild, so the import can run while queries are served.
+    """
+    header = read_snapshot_header(path)
+    embeddings = get_shared_embeddings()
+    if header.get('model') != embeddings.model_name or header.get('dimension') != embeddings.dimension:
+        raise ValueError(
+            f"Snapshot was built with {header.get('model')} ({header.get('dimension')} dimensions), "
+            f"this instance uses {embeddings.model_name} ({embeddings.dimension} dimensions)"
+        )
+    signature = index_signature(CodeChunker(max_chars=CHUNK_MAX_CHARS))
+    if header.get('signature') != signature:
+        logger.warning(
+            f"Snapshot was chunked as {header.get('signature')}, not {signature}; "
+            f"the next reindex of {repo.name} re-chunks every file"
+        )
+
+    with repo.indexing_lock:
+        name = index_name(repo, current_branch(repo.path)) if head_commit(repo.path) else repo.collection
+        version = new_index_version(name)
+        logger.info(f"Importing {header['count']} points from {path} into {version}")
+        store, _ = open_vector_store(embeddings, version)
+        lexical = LexicalIndex(lexical_path(version))
+        try:
+            for ids, vectors, texts, metadatas in iter_snapshot(path):
+                store.add_vectors(vectors, texts, metadatas, ids)
+                lexical.add(ids, texts, metadatas)
+            persist_store(store)
+            lexical.save()
+        except Exception:
+            drop_physical_index(version)
+            raise
+
+        manifest = read_snapshot_manifest(path)
+        next_manifest = f"{manifest_path(name)}.next"
+        if manifest is not None:
+            os.makedirs(os.path.dirname(next_manifest), exist_ok=True)
+            with open(next_manifest, 'wb') as f:
+                f.write(manifest)
+        publish_index(name, version)
+        if manifest is not None:
+            os.replace(next_manifest, manifest_path(name))
+        elif os.path.exists(manifest_path(name)):
+            # A manifest of the replaced index would hide files the snapshot lacks
+            os.remove(manifest_path(name))
+        lexical.path = lexical_path(name)
+        if VECTOR_BACKEND != 'local':
+            store, _ = open_vector_store(embeddings, name)
+        with repo.docsearch_lock:
+            repo.docsearch, repo.lexical_index = store, lexical
+        repo.active_index = name
+        save_active_index(repo, name)
+    query_cache.invalidate()
+    logger.info(f"Imported snapshot of {repo.name} as {name}")
+    return header
+
+@app.route('/admin/snapshot/export')
+def admin_export_snapshot():
+    """Download the index a repository is serving as a snapshot file."""
+    repo = requested_repository()
+    dtype = request.args.get('dtype', SNAPSHOT_DTYPE)
+    if dtype not in SNAPSHOT_DTYPES:
+        return jsonify({'error': f"dtype must be one of {', '.join(SNAPSHOT_DTYPES)}"}), 400
+    os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+    fd, path = tempfile.mkstemp(suffix='.snapshot', dir=SNAPSHOT_DIR)
+    os.close(fd)
+    try:
+        export_snapshot(repo, path, dtype)
+        snapshot = open(path, 'rb')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 409
+    finally:
+        # The open handle keeps the data readable until the download is sent
+        os.remove(path)
+    return send_file(snapshot, mimetype='application/zip', as_attachment=True,
+                     download_name=f"{repo.name}.snapshot")
+
+@app.route('/admin/snapshot/import', methods=['POST'])
+def admin_import_snapshot():
+    """Replace a repository's index with an uploaded snapshot file, or one in the snapshots directory."""
+    repo = requested_repository()
+    if scheduler.active(repo.name) is not None:
+        return jsonify({'error': f"{repo.name} is being indexed; cancel its job first"}), 409
+    upload = request.files.get('snapshot')
+    name = request.form.get('name', '')
+    if upload is not None:
+        os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+        fd, path = tempfile.mkstemp(suffix='.snapshot', dir=SNAPSHOT_DIR)
+        os.close(fd)
+        upload.save(path)
+    elif name and os.path.basename(name) == name:
+        path = os.path.join(SNAPSHOT_DIR, name)
+        if not os.path.isfile(path):
+            return jsonify({'error': f"No snapshot named {name!r}"}), 404
+    else:
+        return jsonify({'error': "Upload a 'snapshot' file or give the 'name' of one"}), 400
+    try:
+        header = import_snapshot(repo, path)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    finally:
+        if upload is not None:
+            os.remove(path)
+    return jsonify({'repository': repo.name, 'index': repo.active_index, 'snapshot': header})
+
+@app.route('/admin/model')
+def model_info():
+    """Load time, warm-up time and memory cost of the shared embedding model."""
+    embeddings = get_loaded_embeddings()
+    if embeddings is None:
+        return jsonify({'loaded': False})
+    return jsonify(dict(embeddings.load_stats, loaded=True))
+
+@app.route('/admin/cache/stats')
+def cache_stats():
+    """Hit/miss counters for the query caches, for sizing them."""
+    stats = query_cache.stats()
+    stats['query_batches'] = query_batcher.stats()
+    stats['highlight'] = highlighter.stats()
+    return jsonify(stats)
+
 @app.route('/admin/settings')
 def show_settings():
     # Get current settings or use defaults
@@ -534,22 +1825,80 @@ def reset_settings():
     session['settings'] = DEFAULT_SETTINGS.copy()
     return jsonify({'success': True})
 
+def load_served_index(repo):
+    """Serve the repository's current branch snapshot if there is one, else the last one served."""
+    repo.active_index = load_active_index(repo)
+    if head_commit(repo.path) and collection_exists(index_name(repo, current_branch(repo.path))):
+        repo.active_index = index_name(repo, current_branch(repo.path))
+    if not collection_exists(repo.active_index):
+        logger.info(f"=== No index found for {repo.name}. Waiting for user to initiate indexing ===")
+        return
+    logger.info(f"=== Using existing index {repo.active_index} for {repo.name} ===")
+    if VECTOR_BACKEND == 'local':
+        repo.docsearch = load_local_store(get_shared_embeddings(), repo.active_index)
+    else:
+        repo.docsearch = QdrantStore(
+            client=get_qdrant_client(),
+            collection_name=repo.active_index,
+            embeddings=get_shared_embeddings()
+        )
+    repo.lexical_index = LexicalIndex.load(lexical_path(repo.active_index))
+
+def run_command(argv):
+    """Index, export or import without starting the server, e.g. to build a snapshot file in CI."""
+    import argparse
+    parser = argparse.ArgumentParser(prog='app.py', description='Code search index commands')
+    commands = parser.add_subparsers(dest='command', required=True)
+    index_command = commands.add_parser('index', help='Index a repository and exit')
+    index_command.add_argument('--rebuild', action='store_true', help='Re-embed everything into a fresh index')
+    export_command = commands.add_parser('export', help='Write the index of a repository to a snapshot file')
+    export_command.add_argument('path')
+    export_command.add_argument('--dtype', choices=SNAPSHOT_DTYPES, default=SNAPSHOT_DTYPE)
+    import_command = commands.add_parser('import', help='Replace the index of a repository with a snapshot file')
+    import_command.add_argument('path')
+    for command in (index_command, export_command, import_command):
+        command.add_argument('--repo', default='', help='Repository name (default: the first configured)')
+    args = parser.parse_args(argv)
+
+    repo = get_repository(args.repo)
+    if repo is None:
+        parser.error(f"Unknown repository {args.repo!r}")
+    load_served_index(repo)
+    if args.command == 'index':
+        background_reindex(repo, rebuild=args.rebuild)
+        logger.info(f"{repo.name}: {repo.progress['message']}")
+        return 1 if repo.progress['status'] == 'error' else 0
+    if args.command == 'export':
+        header = export_snapshot(repo, args.path, args.dtype)
+        logger.info(f"Exported {header['count']} points of {repo.name} to {args.path}")
+    else:
+        header = import_snapshot(repo, args.path)
+        logger.info(f"Imported {header['count']} points into {repo.name} from {args.path}")
+    return 0
+
 if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        sys.exit(run_command(sys.argv[1:]))
     try:
-        if collection_exists():
-            logger.info("=== Using existing index ===")
-            docsearch = Qdrant(
-                client=QdrantClient(url="http://vectorstore:6333"),
-                collection_name="code_chunks",
-                embeddings=SentenceTransformerEmbeddings()
-            )
-        else:
-            logger.info("=== No index found. Waiting for user to initiate indexing ===")
+        for repo in repositories.values():
+            load_served_index(repo)
+
+        if PRELOAD_MODEL and is_serving_process():
+            # Load and warm up now so neither the first query nor the first reindex waits
+            get_shared_embeddings(warm_up=True)
+
+        if WATCH_REPO and is_serving_process():
+            for repo in repositories.values():
+                start_watcher(repo)
         
         logger.info("=================================================")
         logger.info("=== Code Search is ready at http://localhost:5000 ===")
         logger.info("=================================================")
-        app.run(debug=True, host='0.0.0.0', port=5000)
+        if SERVER == 'waitress':
+            from waitress import serve
+            serve(app, host='0.0.0.0', port=5000, threads=SERVER_THREADS)
+        else:
+            app.run(debug=DEBUG, host='0.0.0.0', port=5000, threaded=True)
     except Exception as e:
         logger.error(f"Failed to start application: {e}")
         logger.error(f"Error type: {type(e)}")
@@ -0,0 +1,71 @@
+"""Compare two benchmark result files from bench.run.
+
+    python -m bench.compare baseline.json current.json [--threshold 10]
+
+Prints every timing, throughput and memory metric with its relative change.
+Exits with status 1 if any metric regressed by more than the threshold
+(percent), so the comparison can gate a CI job.
+"""
+import argparse
+import json
+import sys
+
+# Higher is better for these metrics; for everything else lower is better
+HIGHER_IS_BETTER = ('throughput_qps', 'embedding_cache_hit_rate')
+COMPARED_SUFFIXES = ('seconds', '_ms', '_qps', '_mb')
+# Changes to values this small are timer noise and never count as regressions
+NOISE_FLOOR = {'seconds': 0.02, '_ms': 1.0}
+
+
+def flatten(results):
+    """{'indexing.cold.wall_seconds': 1.2, 'queries.x4.p50_ms': 3.1, ...}"""
+    metrics = {}
+
+    def walk(prefix, value):
+        if isinstance(value, dict):
+            for key, item in value.items():
+                walk(f"{prefix}.{key}" if prefix else key, item)
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            if prefix.endswith(COMPARED_SUFFIXES):
+                metrics[prefix] = value
+
+    walk('indexing', results.get('indexing', {}))
+    for level in results.get('queries', []):
+        walk(f"queries.x{level['concurrency']}", level)
+    walk('peak_rss_mb', results.get('peak_rss_mb', 0.0))
+    return metrics
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('baseline')
+    parser.add_argument('current')
+    parser.add_argument('--threshold', type=float, default=10.0, help='Regression threshold in percent')
+    args = parser.parse_args(argv)
+
+    with open(args.baseline, 'r', encoding='utf-8') as f:
+        baseline = flatten(json.load(f))
+    with open(args.current, 'r', encoding='utf-8') as f:
+        current = flatten(json.load(f))
+
+    regressions = []
+    width = max((len(name) for name in current), default=10)
+    for name in sorted(set(baseline) & set(current)):
+        before, after = baseline[name], current[name]
+        if not before:
+            continue
+        change = (after - before) / before * 100
+        worse = -change if name.endswith(HIGHER_IS_BETTER) else change
+        flag = ''
+        floor = next((value for suffix, value in NOISE_FLOOR.items() if name.endswith(suffix)), 0.0)
+        if worse > args.threshold and max(before, after) >= floor:
+            flag = '  REGRESSION'
+            regressions.append(name)
+        print(f"{name:<{width}}  {before:>12.3f}  {after:>12.3f}  {change:+7.1f}%{flag}")
+    if regressions:
+        print(f"\n{len(regressions)} metrics regressed by more than {args.threshold}%")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
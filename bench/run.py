@@ -0,0 +1,289 @@
+"""Benchmark indexing and /query performance against a synthetic repository.
+
+Runs fully offline: the repository is generated, the index uses the
+in-process local vector store, and embeddings come from a hashing stub
+unless ``--model`` points at a Sentence Transformers model directory.
+
+    python -m bench.run --files 2000 --languages python=2,javascript,php --output bench.json
+    python -m bench.compare baseline.json bench.json
+"""
+import argparse
+import functools
+import json
+import logging
+import os
+import platform
+import random
+import resource
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from bench.synthetic import generate_repository, parse_language_mix, sample_queries, touch_files
+
+RESULTS_SCHEMA = 1
+
+
+class PhaseTimer:
+    """Time spent inside wrapped callables, per phase.
+
+    Phases of the indexing pipeline overlap (reading and splitting run ahead
+    of embedding), so each phase reports busy time summed across threads,
+    not a share of the wall clock.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.seconds = {}
+        self.calls = {}
+
+    def wrap(self, owner, attr, phase):
+        original = getattr(owner, attr)
+
+        @functools.wraps(original)
+        def timed(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return original(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - started
+                with self.lock:
+                    self.seconds[phase] = self.seconds.get(phase, 0.0) + elapsed
+                    self.calls[phase] = self.calls.get(phase, 0) + 1
+
+        setattr(owner, attr, timed)
+
+    def take(self):
+        """Per-phase totals since the last call, then reset."""
+        with self.lock:
+            phases = {
+                phase: {'seconds': round(seconds, 4), 'calls': self.calls[phase]}
+                for phase, seconds in sorted(self.seconds.items())
+            }
+            self.seconds.clear()
+            self.calls.clear()
+        return phases
+
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1 << 20 if sys.platform == 'darwin' else 1 << 10), 1)
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def configure_environment(args, workdir):
+    """Settings the app reads at import time."""
+    os.environ['INDEX_DATA_DIR'] = os.path.join(workdir, 'data')
+    os.environ['VECTOR_BACKEND'] = 'local'
+    os.environ['LOCAL_INDEX_TYPE'] = args.index_type
+    os.environ['INDEX_SPLIT_WORKERS'] = str(args.split_workers)
+    os.environ['INDEX_READ_WORKERS'] = str(args.read_workers)
+    os.environ['LEXICAL_SEARCH'] = 'true' if args.lexical else 'false'
+    os.environ['PRELOAD_MODEL'] = 'false'
+    os.environ['WATCH_REPO'] = 'false'
+    os.environ['REPOSITORIES_FILE'] = os.path.join(workdir, 'repositories.json')
+    if args.model != 'stub':
+        os.environ['EMBEDDING_MODEL_PATH'] = args.model
+
+
+def install_timers(app_module, embeddings):
+    from src.chunker import CodeChunker
+    from src.lexical import LexicalIndex
+    from src.manifest import IndexManifest
+    from src.vectorstore import LocalVectorStore
+
+    timer = PhaseTimer()
+    timer.wrap(app_module, 'scan_repository', 'walk')
+    timer.wrap(app_module, 'read_candidate', 'read')
+    timer.wrap(CodeChunker, 'split', 'split')
+    timer.wrap(embeddings, 'embed_documents_array', 'embed')
+    timer.wrap(LocalVectorStore, 'add_vectors', 'upsert')
+    timer.wrap(LexicalIndex, 'add', 'upsert_lexical')
+    timer.wrap(app_module, 'persist_store', 'checkpoint')
+    timer.wrap(LexicalIndex, 'save', 'checkpoint')
+    timer.wrap(IndexManifest, 'save', 'checkpoint')
+    return timer
+
+
+def run_index(app_module, timer, label):
+    repo = app_module.default_repository()
+    started = time.perf_counter()
+    app_module.background_reindex(repo)
+    wall = time.perf_counter() - started
+    progress = repo.progress
+    if progress['status'] != 'complete':
+        raise RuntimeError(f"{label} indexing failed: {progress.get('message')}")
+    result = {
+        'wall_seconds': round(wall, 4),
+        'files': progress['total'],
+        'chunks_embedded': progress.get('chunks_indexed', 0),
+        'embedding_cache_hit_rate': round(progress.get('cache_hit_rate', 0.0), 4),
+        'phases': timer.take(),
+        'peak_rss_mb': peak_rss_mb()
+    }
+    logging.getLogger('bench').warning(
+        f"{label}: {result['wall_seconds']}s, {result['chunks_embedded']} chunks embedded"
+    )
+    return result
+
+
+def run_queries(app_module, queries, concurrency):
+    """Issue every query once through /query with ``concurrency`` client threads."""
+    # Start from cold caches so each level measures real retrieval work
+    app_module.query_cache.invalidate()
+    app_module.query_cache.vectors.clear()
+    clients = threading.local()
+    latencies = []
+    errors = 0
+    lock = threading.Lock()
+
+    def issue(query):
+        nonlocal errors
+        if not hasattr(clients, 'client'):
+            clients.client = app_module.app.test_client()
+        started = time.perf_counter()
+        response = clients.client.get('/query', query_string={'query': query})
+        elapsed = time.perf_counter() - started
+        with lock:
+            latencies.append(elapsed * 1000)
+            if response.status_code != 200:
+                errors += 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(issue, queries))
+    wall = time.perf_counter() - started
+    latencies.sort()
+    return {
+        'concurrency': concurrency,
+        'requests': len(queries),
+        'errors': errors,
+        'throughput_qps': round(len(queries) / wall, 2),
+        'mean_ms': round(sum(latencies) / len(latencies), 3),
+        'p50_ms': round(percentile(latencies, 0.50), 3),
+        'p90_ms': round(percentile(latencies, 0.90), 3),
+        'p99_ms': round(percentile(latencies, 0.99), 3),
+        'max_ms': round(latencies[-1], 3),
+        'peak_rss_mb': peak_rss_mb()
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--files', type=int, default=500, help='Source files in the synthetic repository')
+    parser.add_argument('--languages', default='python,javascript,typescript,php',
+                        help="Language mix as name[=weight] pairs, e.g. 'python=3,php=1'")
+    parser.add_argument('--functions', default='3-12', help='Functions per file, as min-max')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--model', default='stub',
+                        help="'stub' for the hashing stand-in, or a local Sentence Transformers model directory")
+    parser.add_argument('--encode-delay-ms', type=float, default=0.0,
+                        help='Extra time per text for the stub model, to imitate a real model')
+    parser.add_argument('--index-type', default='flat', choices=['flat', 'ivf'])
+    parser.add_argument('--read-workers', type=int, default=8)
+    parser.add_argument('--split-workers', type=int, default=0,
+                        help='Split processes; 0 splits inline so split time is measured separately')
+    parser.add_argument('--no-lexical', dest='lexical', action='store_false', help='Disable BM25 fusion')
+    parser.add_argument('--touch-fraction', type=float, default=0.01,
+                        help='Share of files changed before the incremental reindex')
+    parser.add_argument('--queries', type=int, default=200, help='Queries per concurrency level')
+    parser.add_argument('--concurrency', default='1,4,16', help='Comma-separated client thread counts')
+    parser.add_argument('--workdir', help='Where to generate the repository and index (default: a temp dir)')
+    parser.add_argument('--keep', action='store_true', help='Keep the work directory afterwards')
+    parser.add_argument('--output', help='Write the JSON results here instead of stdout')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    workdir = args.workdir or tempfile.mkdtemp(prefix='code-rag-bench-')
+    repo_root = os.path.join(workdir, 'repo')
+    shutil.rmtree(repo_root, ignore_errors=True)
+    shutil.rmtree(os.path.join(workdir, 'data'), ignore_errors=True)
+    configure_environment(args, workdir)
+
+    low, _, high = args.functions.partition('-')
+    started = time.perf_counter()
+    rel_paths = generate_repository(
+        repo_root, args.files, parse_language_mix(args.languages),
+        functions_per_file=(int(low), int(high or low)), seed=args.seed
+    )
+    generate_seconds = time.perf_counter() - started
+    repo_bytes = sum(os.path.getsize(os.path.join(repo_root, path)) for path in rel_paths)
+
+    # Imported late: the app reads its configuration from the environment at import time
+    import app as app_module
+    import src.embeddings
+    from src.gitinfo import head_commit
+    logging.getLogger().setLevel(logging.WARNING)
+
+    app_module.default_repository().path = repo_root
+    if args.model == 'stub':
+        from bench.stub_model import StubEmbeddings
+        src.embeddings._shared_embeddings = StubEmbeddings(
+            cache_dir=app_module.EMBEDDING_CACHE_DIR,
+            cache_max_entries=app_module.EMBEDDING_CACHE_MAX_ENTRIES,
+            encode_delay=args.encode_delay_ms / 1000
+        )
+    embeddings = app_module.get_shared_embeddings()
+    timer = install_timers(app_module, embeddings)
+
+    try:
+        indexing = {'cold': run_index(app_module, timer, 'cold')}
+        indexing['noop'] = run_index(app_module, timer, 'noop')
+        changed = touch_files(repo_root, rel_paths, args.touch_fraction, seed=args.seed)
+        indexing['incremental'] = run_index(app_module, timer, 'incremental')
+        indexing['incremental']['files_changed'] = len(changed)
+
+        queries = []
+        for level in (int(c) for c in args.concurrency.split(',')):
+            # Fresh query text per level so no level reuses another's cached vectors
+            level_queries = sample_queries(random.Random(f"{args.seed}-{level}"), args.queries)
+            queries.append(run_queries(app_module, level_queries, level))
+            logging.getLogger('bench').warning(
+                f"queries x{level}: p50 {queries[-1]['p50_ms']}ms, {queries[-1]['throughput_qps']} qps"
+            )
+
+        results = {
+            'schema': RESULTS_SCHEMA,
+            'started_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'commit': head_commit(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+            'platform': {
+                'python': platform.python_version(),
+                'machine': platform.machine(),
+                'cpus': os.cpu_count()
+            },
+            'config': {key: value for key, value in vars(args).items() if key not in ('output', 'workdir', 'keep')},
+            'repository': {
+                'files': len(rel_paths),
+                'bytes': repo_bytes,
+                'generate_seconds': round(generate_seconds, 4)
+            },
+            'indexing': indexing,
+            'queries': queries,
+            'peak_rss_mb': peak_rss_mb()
+        }
+    finally:
+        if not args.keep and not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,46 @@
+import hashlib
+import re
+import time
+
+import numpy as np
+
+from src.embedding_cache import EmbeddingCache
+from src.embeddings import SentenceTransformerEmbeddings
+
+TOKEN_PATTERN = re.compile(r'[A-Za-z]+|\d+')
+
+
+class StubEmbeddings(SentenceTransformerEmbeddings):
+    """Offline stand-in for the embedding model.
+
+    Texts are embedded by hashing their tokens into a fixed number of
+    buckets, so similar code gets similar vectors without loading a model.
+    ``encode_delay`` adds a fixed cost per text to roughly imitate model
+    throughput. Everything around ``_encode`` (chunk cache, batching) is the
+    real implementation.
+    """
+
+    def __init__(self, dimension=384, cache_dir=None, cache_max_entries=200_000, encode_delay=0.0):
+        self.model_name = 'bench-stub'
+        self.model = None
+        self.batch_size = 32
+        self.normalize = False
+        self.dimension = dimension
+        self.encode_delay = encode_delay
+        self.load_stats = {
+            'model': self.model_name, 'source': 'stub', 'load_seconds': 0.0,
+            'rss_delta_mb': 0.0, 'warm_up_seconds': None
+        }
+        self.cache = None
+        if cache_dir:
+            self.cache = EmbeddingCache(cache_dir, self.model_name, dimension, max_entries=cache_max_entries)
+
+    def _encode(self, texts):
+        vectors = np.zeros((len(texts), self.dimension), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for token in TOKEN_PATTERN.findall(text.lower()):
+                digest = hashlib.blake2b(token.encode('utf-8'), digest_size=4).digest()
+                vectors[row, int.from_bytes(digest, 'little') % self.dimension] += 1.0
+        if self.encode_delay:
+            time.sleep(self.encode_delay * len(texts))
+        return vectors
@@ -0,0 +1,132 @@
+import os
+import random
+
+# Identifier parts synthetic code is built from; small enough that names repeat across files
+WORDS = [
+    'user', 'account', 'order', 'invoice', 'payment', 'session', 'token', 'cache', 'queue',
+    'bucket', 'upload', 'report', 'config', 'request', 'response', 'client', 'record', 'event',
+    'message', 'profile', 'address', 'product', 'cart', 'price', 'tax', 'email', 'audit'
+]
+VERBS = ['get', 'load', 'save', 'build', 'parse', 'validate', 'send', 'fetch', 'update', 'delete']
+
+
+def _name(rng, style):
+    parts = [rng.choice(VERBS)] + rng.sample(WORDS, 2)
+    if style == 'snake':
+        return '_'.join(parts)
+    return parts[0] + ''.join(part.title() for part in parts[1:])
+
+
+def _class_name(rng):
+    return ''.join(part.title() for part in rng.sample(WORDS, 2)) + 'Service'
+
+
+def _body(rng, indent, statement):
+    lines = []
+    for _ in range(rng.randint(2, 8)):
+        lines.append(indent + statement(rng.choice(WORDS), rng.choice(WORDS), rng.randint(1, 100)))
+    return lines
+
+
+def python_source(rng, n_functions):
+    lines = ['import logging', '', 'logger = logging.getLogger(__name__)', '']
+    lines += [f"class {_class_name(rng)}:", f'    """Handles {rng.choice(WORDS)} {rng.choice(WORDS)}s."""', '']
+    for _ in range(n_functions):
+        lines.append(f"    def {_name(rng, 'snake')}(self, {rng.choice(WORDS)}, limit=10):")
+        lines.append(f'        """{rng.choice(VERBS).title()} the {rng.choice(WORDS)} for a {rng.choice(WORDS)}."""')
+        lines += _body(rng, '        ', lambda a, b, n: f"{a}_{b} = self.{b}.get('{a}', {n})")
+        lines += [f"        return {rng.choice(WORDS)}", '']
+    return '\n'.join(lines)
+
+
+def javascript_source(rng, n_functions):
+    lines = [f"import {{ {_name(rng, 'camel')} }} from './{rng.choice(WORDS)}';", '']
+    for _ in range(n_functions):
+        lines.append(f"export function {_name(rng, 'camel')}({rng.choice(WORDS)}, options = {{}}) {{")
+        lines += _body(rng, '  ', lambda a, b, n: f"const {a}{b.title()} = options.{b} || {n};")
+        lines += [f"  return {rng.choice(WORDS)};", '}', '']
+    return '\n'.join(lines)
+
+
+def typescript_source(rng, n_functions):
+    lines = [f"export interface {_class_name(rng)}Options {{", f"  {rng.choice(WORDS)}: number;", '}', '']
+    for _ in range(n_functions):
+        lines.append(f"export function {_name(rng, 'camel')}({rng.choice(WORDS)}: string): number {{")
+        lines += _body(rng, '  ', lambda a, b, n: f"const {a}{b.title()}: number = {n};")
+        lines += [f"  return {rng.randint(0, 9)};", '}', '']
+    return '\n'.join(lines)
+
+
+def php_source(rng, n_functions):
+    lines = ['<?php', '', f"namespace App\\{rng.choice(WORDS).title()};", '', f"class {_class_name(rng)}", '{']
+    for _ in range(n_functions):
+        lines.append(f"    public function {_name(rng, 'camel')}(${rng.choice(WORDS)}, $limit = 10)")
+        lines.append('    {')
+        lines += _body(rng, '        ', lambda a, b, n: f"${a} = $this->{b}->find({n});")
+        lines += [f"        return ${rng.choice(WORDS)};", '    }', '']
+    lines.append('}')
+    return '\n'.join(lines)
+
+
+LANGUAGES = {
+    'python': ('.py', python_source),
+    'javascript': ('.js', javascript_source),
+    'typescript': ('.ts', typescript_source),
+    'php': ('.php', php_source)
+}
+
+
+def parse_language_mix(spec):
+    """'python=2,php=1' -> {'python': 2.0, 'php': 1.0}; bare names weigh 1."""
+    mix = {}
+    for part in spec.split(','):
+        name, _, weight = part.strip().partition('=')
+        if name not in LANGUAGES:
+            raise ValueError(f"Unknown language {name!r}, expected one of {', '.join(LANGUAGES)}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def generate_repository(root, n_files, language_mix, functions_per_file=(3, 12),
+                        files_per_dir=20, seed=0):
+    """Write a deterministic synthetic repository of ``n_files`` source files under ``root``.
+
+    Files are spread over nested package directories and their languages
+    follow the weights in ``language_mix``. Returns the relative paths written.
+    """
+    rng = random.Random(seed)
+    names, weights = zip(*language_mix.items())
+    paths = []
+    for i in range(n_files):
+        language = rng.choices(names, weights)[0]
+        extension, source = LANGUAGES[language]
+        package = i // files_per_dir
+        rel_dir = f"src/pkg{package // files_per_dir}/mod{package % files_per_dir}"
+        rel_path = f"{rel_dir}/{rng.choice(WORDS)}_{i}{extension}"
+        os.makedirs(os.path.join(root, rel_dir), exist_ok=True)
+        with open(os.path.join(root, rel_path), 'w', encoding='utf-8') as f:
+            f.write(source(rng, rng.randint(*functions_per_file)))
+        paths.append(rel_path)
+    return paths
+
+
+def touch_files(root, rel_paths, fraction, seed=0):
+    """Append a comment line to a fraction of the files, as a small commit would."""
+    rng = random.Random(seed)
+    changed = rng.sample(rel_paths, max(1, int(len(rel_paths) * fraction)))
+    for rel_path in changed:
+        comment = '#' if rel_path.endswith('.py') else '//'
+        with open(os.path.join(root, rel_path), 'a', encoding='utf-8') as f:
+            f.write(f"\n{comment} {_name(rng, 'camel')} changed\n")
+    return changed
+
+
+def sample_queries(rng, n):
+    """Prose and identifier queries drawn from the same vocabulary as the code."""
+    queries = []
+    for i in range(n):
+        if i % 3 == 0:
+            queries.append(_name(rng, rng.choice(['snake', 'camel'])))
+        else:
+            queries.append(f"how do we {rng.choice(VERBS)} the {rng.choice(WORDS)} {rng.choice(WORDS)}")
+    return queries
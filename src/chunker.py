@@ -0,0 +1,221 @@
+import logging
+import os
+from functools import lru_cache
+
+from pygments.lexers import get_lexer_for_filename
+from pygments.token import Comment, Keyword, Name, Text, Whitespace
+from pygments.util import ClassNotFound
+
+logger = logging.getLogger(__name__)
+
+CHUNKER_VERSION = 2
+
+# First words of a line that start a definition, across the languages we index
+DEFINITION_KEYWORDS = {
+    'def', 'class', 'async', 'function', 'interface', 'trait', 'enum', 'struct', 'impl',
+    'fn', 'func', 'module', 'namespace', 'export', 'public', 'private', 'protected',
+    'static', 'abstract', 'final', 'const', 'let', 'var', 'type', 'macro', 'block'
+}
+
+# Extensions that have no definitions worth splitting on; they go straight to line windows
+PLAIN_EXTENSIONS = {'.json', '.yaml', '.yml', '.txt', '.md'}
+
+
+@lru_cache(maxsize=256)
+def _language_for_extension(extension):
+    try:
+        return get_lexer_for_filename(f"file{extension}").aliases[0]
+    except (ClassNotFound, IndexError):
+        return extension.lstrip('.') or 'text'
+
+
+def language_for_path(path):
+    """Short language name for a file (Pygments' primary alias, e.g. 'python', 'php')."""
+    return _language_for_extension(os.path.splitext(path)[1].lower())
+
+
+def split_lines(code):
+    """``code.splitlines(keepends=True)``, but breaking on '\n' alone."""
+    lines = code.split('\n')
+    last = lines.pop()
+    lines = [line + '\n' for line in lines]
+    if last:
+        lines.append(last)
+    return lines
+
+
+class CodeChunker:
+    """Split source files into chunks along definition boundaries.
+
+    Definitions (functions, classes, decorators and the comments directly
+    above them) are found from the Pygments token stream of the file's
+    language. Adjacent small definitions are packed together up to
+    ``max_chars``; a definition that is too large is split on the
+    definitions nested inside it, and anything still too large (or in a
+    language without a lexer) falls back to line windows. Chunks never
+    overlap, and every chunk carries the exact 1-based line range it covers.
+    """
+
+    def __init__(self, max_chars=2000):
+        self.max_chars = max_chars
+        self._lexers = {}
+
+    @property
+    def signature(self):
+        """Identifies the chunking scheme; chunks from a different scheme must be rebuilt."""
+        return f"code-v{CHUNKER_VERSION}:{self.max_chars}"
+
+    def _lexer_for(self, filename):
+        extension = os.path.splitext(filename)[1].lower()
+        if extension in PLAIN_EXTENSIONS:
+            return None
+        if extension not in self._lexers:
+            try:
+                self._lexers[extension] = get_lexer_for_filename(filename, stripnl=False, ensurenl=False)
+            except ClassNotFound:
+                self._lexers[extension] = None
+        return self._lexers[extension]
+
+    def split(self, code, filename):
+        r"""Split ``code`` and return (chunks, line_numbers) with {'start', 'end'} per chunk.
+
+        Lines are split on '\n' only, as editors and the tokenizer count them;
+        form feeds and Unicode line separators stay inside their line:
+
+        >>> CodeChunker().split('a = 1\n\x0c\nb = 2\u2028c = 3\n', 'x.py')[1]
+        [{'start': 1, 'end': 3}]
+        >>> CodeChunker(max_chars=12).split('a = 1\n\x0c\nb = 2\n', 'x.py')[1]
+        [{'start': 1, 'end': 1}, {'start': 3, 'end': 3}]
+        """
+        lines = split_lines(code)
+        if not lines:
+            return [], []
+
+        lexer = self._lexer_for(filename)
+        starts = self._definition_starts(code, lines, lexer) if lexer is not None else {}
+
+        spans = self._split_range(lines, 0, len(lines), starts)
+        chunks, line_numbers = [], []
+        for start, end in spans:
+            # Drop blank lines at the edges so the reported range is exact
+            while start < end and not lines[start].strip():
+                start += 1
+            while end > start and not lines[end - 1].strip():
+                end -= 1
+            if start == end:
+                continue
+            text = ''.join(lines[start:end])
+            if len(text) > self.max_chars:
+                # A single over-long line (minified code); cut it by characters
+                for offset in range(0, len(text), self.max_chars):
+                    chunks.append(text[offset:offset + self.max_chars])
+                    line_numbers.append({'start': start + 1, 'end': end})
+                continue
+            chunks.append(text)
+            line_numbers.append({'start': start + 1, 'end': end})
+        return chunks, line_numbers
+
+    def _definition_starts(self, code, lines, lexer):
+        """Map line index -> indentation for lines that begin a definition.
+
+        A definition's start is moved up over the decorators and comments
+        directly above it so they stay in the same chunk.
+        """
+        first_tokens = {}
+        line_index = 0
+        at_line_start = True
+        try:
+            for _, ttype, value in lexer.get_tokens_unprocessed(code):
+                if at_line_start and value.strip() and ttype not in Text and ttype not in Whitespace:
+                    first_tokens[line_index] = (ttype, value.strip())
+                    at_line_start = False
+                newlines = value.count('\n')
+                if newlines:
+                    line_index += newlines
+                    at_line_start = not value[value.rfind('\n') + 1:].strip()
+        except Exception as e:
+            logger.debug(f"Could not tokenize for chunking: {e}")
+            return {}
+
+        def indentation(index):
+            line = lines[index]
+            return len(line) - len(line.lstrip())
+
+        def is_definition(index):
+            token = first_tokens.get(index)
+            if token is None:
+                return False
+            ttype, value = token
+            if ttype in Name.Decorator or value.startswith('@'):
+                return True
+            return ttype in Keyword and value.split()[0].lower() in DEFINITION_KEYWORDS
+
+        def is_attached(index):
+            # Decorators and comments directly above a definition belong to it
+            token = first_tokens.get(index)
+            return token is not None and (token[0] in Comment or token[0] in Name.Decorator)
+
+        starts = {}
+        for index in range(len(lines)):
+            if not is_definition(index) or (index - 1) in starts:
+                continue
+            start = index
+            while start > 0 and is_attached(start - 1) and indentation(start - 1) == indentation(index):
+                start -= 1
+            starts[start] = indentation(index)
+        return starts
+
+    def _split_range(self, lines, begin, end, starts):
+        """Split lines[begin:end] into (start, end) spans no larger than max_chars."""
+        size = sum(len(line) for line in lines[begin:end])
+        if size <= self.max_chars:
+            return [(begin, end)]
+
+        # Boundaries are the least-indented definitions inside the range
+        inner = [index for index in starts if begin < index < end]
+        if not inner:
+            return self._line_windows(lines, begin, end)
+        level = min(starts[index] for index in inner)
+        boundaries = sorted(index for index in inner if starts[index] == level)
+
+        edges = [begin] + boundaries + [end]
+        segments = []
+        for seg_start, seg_end in zip(edges, edges[1:]):
+            if sum(len(line) for line in lines[seg_start:seg_end]) > self.max_chars:
+                segments.extend(self._split_range(lines, seg_start, seg_end, starts))
+            else:
+                segments.append((seg_start, seg_end))
+        return self._pack(lines, segments)
+
+    def _pack(self, lines, segments):
+        """Merge adjacent spans while they fit in max_chars."""
+        packed = []
+        current_start = current_end = None
+        current_size = 0
+        for start, end in segments:
+            size = sum(len(line) for line in lines[start:end])
+            if current_start is not None and current_size + size <= self.max_chars:
+                current_end = end
+                current_size += size
+                continue
+            if current_start is not None:
+                packed.append((current_start, current_end))
+            current_start, current_end, current_size = start, end, size
+        if current_start is not None:
+            packed.append((current_start, current_end))
+        return packed
+
+    def _line_windows(self, lines, begin, end):
+        """Consecutive, non-overlapping windows of whole lines up to max_chars each."""
+        windows = []
+        window_start = begin
+        size = 0
+        for index in range(begin, end):
+            line_size = len(lines[index])
+            if size and size + line_size > self.max_chars:
+                windows.append((window_start, index))
+                window_start, size = index, 0
+            size += line_size
+        if window_start < end:
+            windows.append((window_start, end))
+        return windows
@@ -0,0 +1,158 @@
+import hashlib
+import json
+import logging
+import os
+import re
+from threading import Lock
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+CACHE_VERSION = 1
+
+
+def chunk_key(text: str) -> str:
+    """Cache key for a chunk: a digest of its exact text."""
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+class EmbeddingCache:
+    """Persistent, size-bounded cache of chunk embeddings for one model.
+
+    Vectors live in a memory-mapped float32 matrix (``vectors.f32``) with one
+    row per cached chunk; ``index.json`` maps chunk keys to their row and a
+    last-used tick. When the matrix is full the least recently used rows are
+    evicted and their slots reused.
+    """
+
+    def __init__(self, directory, model_name, dimension, max_entries=200_000, evict_fraction=0.1):
+        safe_model = re.sub(r'[^A-Za-z0-9_.-]+', '_', model_name)
+        self.directory = os.path.join(directory, safe_model)
+        self.model_name = model_name
+        self.dimension = dimension
+        self.capacity = max_entries
+        self.evict_count = max(1, int(max_entries * evict_fraction))
+        self.lock = Lock()
+        self.hits = 0
+        self.misses = 0
+        self._entries = {}  # key -> [row, last_used]
+        self._free_rows = []
+        self._next_row = 0
+        self._clock = 0
+        self._dirty = False
+        self._load()
+
+    @property
+    def index_path(self):
+        return os.path.join(self.directory, 'index.json')
+
+    @property
+    def vectors_path(self):
+        return os.path.join(self.directory, 'vectors.f32')
+
+    def _load(self):
+        os.makedirs(self.directory, exist_ok=True)
+        index = None
+        if os.path.exists(self.index_path) and os.path.exists(self.vectors_path):
+            try:
+                with open(self.index_path, 'r', encoding='utf-8') as f:
+                    index = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Embedding cache index unreadable, starting fresh: {e}")
+        if index and (
+            index.get('version') != CACHE_VERSION
+            or index.get('dimension') != self.dimension
+            or index.get('capacity') != self.capacity
+            or index.get('model') != self.model_name
+        ):
+            logger.info("Embedding cache layout changed, starting fresh")
+            index = None
+
+        mode = 'r+' if index else 'w+'
+        self._vectors = np.memmap(
+            self.vectors_path, dtype=np.float32, mode=mode, shape=(self.capacity, self.dimension)
+        )
+        if index:
+            self._entries = index['entries']
+            self._clock = index['clock']
+            used = {row for row, _ in self._entries.values()}
+            self._next_row = max(used) + 1 if used else 0
+            self._free_rows = [row for row in range(self._next_row) if row not in used]
+            logger.info(f"Loaded embedding cache with {len(self._entries)} entries")
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+
+    def get_many(self, keys):
+        """Look up keys; returns {position: vector} for the keys that were cached."""
+        found = {}
+        with self.lock:
+            self._clock += 1
+            for position, key in enumerate(keys):
+                entry = self._entries.get(key)
+                if entry is None:
+                    self.misses += 1
+                    continue
+                entry[1] = self._clock
+                found[position] = np.array(self._vectors[entry[0]])
+                self.hits += 1
+            if found:
+                self._dirty = True
+        return found
+
+    def put_many(self, keys, vectors):
+        """Store vectors for keys, evicting the least recently used rows if full."""
+        with self.lock:
+            self._clock += 1
+            for key, vector in zip(keys, vectors):
+                entry = self._entries.get(key)
+                if entry is None:
+                    entry = [self._allocate_row(), self._clock]
+                    self._entries[key] = entry
+                entry[1] = self._clock
+                self._vectors[entry[0]] = vector
+            self._dirty = True
+
+    def _allocate_row(self):
+        if self._free_rows:
+            return self._free_rows.pop()
+        if self._next_row < self.capacity:
+            row = self._next_row
+            self._next_row += 1
+            return row
+        # Full: evict a slice of the least recently used entries in one go
+        victims = sorted(self._entries.items(), key=lambda item: item[1][1])[:self.evict_count]
+        for key, (row, _) in victims:
+            del self._entries[key]
+            self._free_rows.append(row)
+        logger.info(f"Evicted {len(victims)} entries from the embedding cache")
+        return self._free_rows.pop()
+
+    def flush(self):
+        """Persist the vectors and the index."""
+        with self.lock:
+            if not self._dirty:
+                return
+            self._vectors.flush()
+            tmp_path = f"{self.index_path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({
+                    'version': CACHE_VERSION,
+                    'model': self.model_name,
+                    'dimension': self.dimension,
+                    'capacity': self.capacity,
+                    'clock': self._clock,
+                    'entries': self._entries
+                }, f)
+            os.replace(tmp_path, self.index_path)
+            self._dirty = False
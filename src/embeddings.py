@@ -1,39 +1,202 @@
 from sentence_transformers import SentenceTransformer
 from langchain.embeddings.base import Embeddings
-from pygments import highlight
-from pygments.formatters import HtmlFormatter
-from pygments.lexers import get_lexer_by_name, guess_lexer
-from pygments.util import ClassNotFound
+import logging
+import os
 import sys
+import queue
+import time
+from concurrent.futures import Future
+from threading import Lock, Thread
+import numpy as np
+from src.embedding_cache import EmbeddingCache, chunk_key
+
+logger = logging.getLogger(__name__)
+
+# Process-wide embeddings instance shared by indexing and queries
+_shared_embeddings = None
+_shared_embeddings_lock = Lock()
+
+WARM_UP_TEXTS = [
+    "def handler(request):\n    return response",
+    "How do we authenticate API requests?"
+]
+
+def _rss_bytes():
+    """Current resident set size of this process, or 0 if it cannot be read."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return 0
 
 class SentenceTransformerEmbeddings(Embeddings):
-    def __init__(self, model_name="all-MiniLM-L6-v2"):
-        self.model = SentenceTransformer(model_name)
+    def __init__(self, model_name="all-MiniLM-L6-v2", cache_dir=None, cache_max_entries=200_000,
+                 batch_size=32, normalize=False, model_path=None):
+        self.model_name = model_name
+        # A local model directory (e.g. baked into the image) avoids any network access
+        source = model_path if model_path and os.path.isdir(model_path) else model_name
+        rss_before = _rss_bytes()
+        started = time.perf_counter()
+        self.model = SentenceTransformer(source)
+        self.load_stats = {
+            'model': model_name,
+            'source': source,
+            'load_seconds': round(time.perf_counter() - started, 3),
+            'rss_delta_mb': round((_rss_bytes() - rss_before) / (1 << 20), 1),
+            'warm_up_seconds': None
+        }
+        logger.info(
+            f"Loaded embedding model {model_name} from {source} in "
+            f"{self.load_stats['load_seconds']}s (+{self.load_stats['rss_delta_mb']} MB RSS)"
+        )
+        # Passed to encode(), which already length-sorts each call's texts before
+        # batching, so larger calls waste less padding
+        self.batch_size = batch_size
+        self.normalize = normalize
+        self.dimension = self.model.get_sentence_embedding_dimension()
+        self.cache = None
+        if cache_dir:
+            self.cache = EmbeddingCache(
+                cache_dir,
+                model_name,
+                self.dimension,
+                max_entries=cache_max_entries
+            )
+
+    def warm_up(self):
+        """Run a throwaway encode so the first real query doesn't pay lazy initialisation."""
+        started = time.perf_counter()
+        self._encode(WARM_UP_TEXTS)
+        self.load_stats['warm_up_seconds'] = round(time.perf_counter() - started, 3)
+        logger.info(f"Embedding model warmed up in {self.load_stats['warm_up_seconds']}s")
+
+    def _encode(self, texts):
+        """Encode texts into a float32 NumPy array with the configured batch settings."""
+        return self.model.encode(
+            texts,
+            batch_size=self.batch_size,
+            normalize_embeddings=self.normalize,
+            convert_to_numpy=True,
+            show_progress_bar=False
+        ).astype(np.float32, copy=False)
+
+    def embed_documents_array(self, texts):
+        """Embed a list of texts into a (len(texts), dimension) float32 array.
+
+        Cached vectors are reused for chunks seen before; only misses are encoded.
+        """
+        if self.cache is None:
+            return self._encode(texts)
+
+        keys = [chunk_key(text) for text in texts]
+        vectors = np.empty((len(texts), self.dimension), dtype=np.float32)
+        cached = self.cache.get_many(keys)
+        for i, vector in cached.items():
+            vectors[i] = vector
+        missing = [i for i in range(len(texts)) if i not in cached]
+        if missing:
+            # Identical chunks (e.g. vendored copies) in one batch are encoded once
+            unique = {}
+            for i in missing:
+                unique.setdefault(keys[i], texts[i])
+            encoded = self._encode(list(unique.values()))
+            self.cache.put_many(list(unique.keys()), encoded)
+            row_by_key = {key: row for row, key in enumerate(unique.keys())}
+            for i in missing:
+                vectors[i] = encoded[row_by_key[keys[i]]]
+        return vectors
 
     def embed_documents(self, texts):
         """Embed a list of texts."""
-        embeddings = self.model.encode(texts)
-        return embeddings.tolist()
+        return self.embed_documents_array(texts).tolist()
+
+    def embed_queries_array(self, texts):
+        """Embed several queries in one encode call; queries bypass the chunk cache."""
+        return self._encode(texts)
 
     def embed_query(self, text):
         """Embed a single text."""
-        embedding = self.model.encode([text])
+        embedding = self.embed_queries_array([text])
         return embedding[0].tolist()  # Return the first embedding since we only encoded one text 
 
-def format_code_for_display(code_snippet: str, language: str = None, line_start: int = 1) -> str:
-    """Format code snippet with syntax highlighting and line numbers"""
-    # Force PHP lexer and ensure it recognizes PHP code
-    lexer = get_lexer_by_name('php', stripall=True)
-    lexer.startinline = True  # Treat code as if it's already inside <?php
-
-    highlighted = highlight(
-        code_snippet,
-        lexer,
-        HtmlFormatter(
-            linenos=True,
-            linenostart=line_start,
-            cssclass="source",
-            style="monokai"
-        )
-    )
-    return highlighted 
\ No newline at end of file
+
+class QueryBatcher:
+    """Coalesce query embeddings from concurrent requests into single encode calls.
+
+    Callers block on their own future while one worker thread encodes. The
+    worker takes every query waiting in the queue (up to ``max_batch``),
+    lingering ``max_wait`` seconds for stragglers, so under load queries share
+    a forward pass instead of queueing behind each other's encodes.
+    """
+
+    def __init__(self, embed_batch, max_batch=32, max_wait=0.002):
+        self.embed_batch = embed_batch
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.batches = 0
+        self.queries = 0
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = Lock()
+
+    def embed_query(self, text):
+        """Embed one query, batched with any others in flight; returns a list of floats."""
+        self._ensure_worker()
+        future = Future()
+        self._queue.put((text, future))
+        return future.result()
+
+    def _ensure_worker(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = Thread(target=self._run, name='query-batcher', daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch:
+                try:
+                    remaining = deadline - time.monotonic()
+                    batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                vectors = self.embed_batch([text for text, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            self.batches += 1
+            self.queries += len(batch)
+            for (_, future), vector in zip(batch, vectors):
+                future.set_result(vector.tolist())
+
+    def stats(self):
+        return {
+            'batches': self.batches,
+            'queries': self.queries,
+            'mean_batch_size': round(self.queries / self.batches, 2) if self.batches else 0.0
+        }
+
+def get_embeddings(model_name="all-MiniLM-L6-v2", warm_up=False, **kwargs):
+    """Return the shared embeddings instance, loading the model on first use.
+
+    Thread-safe: concurrent first calls wait for a single load. Arguments only
+    matter on the call that creates the instance.
+    """
+    global _shared_embeddings
+    if _shared_embeddings is None:
+        with _shared_embeddings_lock:
+            if _shared_embeddings is None:
+                embeddings = SentenceTransformerEmbeddings(model_name, **kwargs)
+                if warm_up:
+                    embeddings.warm_up()
+                _shared_embeddings = embeddings
+    return _shared_embeddings
+
+def get_loaded_embeddings():
+    """The shared embeddings instance if the model has been loaded, else None."""
+    return _shared_embeddings
@@ -0,0 +1,144 @@
+import fnmatch
+import re
+
+# Files that are never worth embedding, by name: dependency lockfiles and build output
+SKIPPED_NAMES = {
+    'package-lock.json': 'lockfile',
+    'npm-shrinkwrap.json': 'lockfile',
+    'yarn.lock': 'lockfile',
+    'pnpm-lock.yaml': 'lockfile',
+    'composer.lock': 'lockfile',
+    'poetry.lock': 'lockfile',
+    'Pipfile.lock': 'lockfile',
+    'Gemfile.lock': 'lockfile',
+    'Cargo.lock': 'lockfile',
+    '*.min.js': 'minified',
+    '*.min.css': 'minified',
+    '*.bundle.js': 'minified',
+    '*.map': 'minified',
+}
+
+# Markers code generators put in a file's leading comment header
+GENERATED_MARKER = re.compile(
+    rb'@generated\b|\bCode generated\b.*\bDO NOT EDIT\.|\bThis file (?:was|is) (?:automatically |auto-)?generated\b',
+    re.IGNORECASE
+)
+# The header is the comment lines at the top of the file (blank lines allowed),
+# looked at within the first GENERATED_HEADER_BYTES and GENERATED_HEADER_LINES
+GENERATED_HEADER_BYTES = 1024
+GENERATED_HEADER_LINES = 10
+COMMENT_PREFIXES = (b'#', b'//', b'/*', b'*', b'<!--', b'--', b';', b'%', b'{#')
+# Opening tags (<?php, <?xml) may come before the header
+HEADER_PREAMBLE = b'<?'
+
+# Control bytes that never appear in text (tab, newlines, form feed and escape excluded)
+_TEXT_CONTROL = {7, 8, 9, 10, 12, 13, 27}
+_NON_TEXT = bytes(b for b in range(32) if b not in _TEXT_CONTROL) + b'\x7f'
+BINARY_MAX_NON_TEXT_RATIO = 0.3
+
+# Files smaller than this are never treated as minified
+MINIFIED_MIN_BYTES = 1024
+
+# Bumped when the built-in checks change, so indexes re-check their files
+FILE_FILTER_RULES_VERSION = 2
+
+
+def is_generated(data):
+    """True if a generator marker appears in the comment header at the top of ``data``.
+
+    Only comment lines before the first line of code count, so a docstring or
+    comment that merely mentions generated code further down does not.
+    """
+    for line in data[:GENERATED_HEADER_BYTES].split(b'\n')[:GENERATED_HEADER_LINES]:
+        line = line.strip()
+        if not line or line.startswith(HEADER_PREAMBLE):
+            continue
+        if not line.startswith(COMMENT_PREFIXES):
+            return False
+        if GENERATED_MARKER.search(line):
+            return True
+    return False
+
+
+class FileFilter:
+    """Cheap checks that keep files not worth embedding out of the index.
+
+    ``check_path`` runs on the walk's stat result before a file is read: size
+    caps and known lockfile and bundle names. ``check_content`` runs on the
+    bytes once they are read: binary sniffing over the first ``sniff_bytes``,
+    generator markers in the leading comment header, and minified code (very long lines, or too few
+    newlines for the file's size). Both return a skip reason, or None to
+    index the file.
+
+    ``overrides`` maps glob patterns (matched against the path relative to
+    the repository, and against the file name) to option changes for the
+    files they match, e.g. ``{"fixtures/*.json": {"max_bytes": 20000},
+    "yarn.lock": {"skip_names": false}, "src/gen/*": {"generated": false}}``.
+    Later patterns win.
+    """
+
+    def __init__(self, max_bytes=512_000, sniff_bytes=8192, max_line_length=5000,
+                 max_average_line_length=300, overrides=None):
+        self.defaults = {
+            'max_bytes': max_bytes,
+            'max_line_length': max_line_length,
+            'max_average_line_length': max_average_line_length,
+            'binary': True,
+            'generated': True,
+            'minified': True,
+            'skip_names': True
+        }
+        self.sniff_bytes = sniff_bytes
+        self.overrides = [(pattern, dict(options)) for pattern, options in (overrides or {}).items()]
+        unknown = {key for _, options in self.overrides for key in options} - set(self.defaults)
+        if unknown:
+            raise ValueError(f"Unknown file limit options: {', '.join(sorted(unknown))}")
+
+    def describe(self):
+        """Every limit this filter applies, for telling whether two filters select the same files."""
+        return {
+            'rules': FILE_FILTER_RULES_VERSION,
+            'defaults': self.defaults,
+            'sniff_bytes': self.sniff_bytes,
+            'overrides': self.overrides
+        }
+
+    def options(self, rel_path):
+        """Limits for one file: the defaults with every matching override applied."""
+        if not self.overrides:
+            return self.defaults
+        name = rel_path.rsplit('/', 1)[-1]
+        options = dict(self.defaults)
+        for pattern, changes in self.overrides:
+            if fnmatch.fnmatchcase(rel_path, pattern) or fnmatch.fnmatchcase(name, pattern):
+                options.update(changes)
+        return options
+
+    def check_path(self, rel_path, size):
+        """Skip reason from the file's name and size alone."""
+        options = self.options(rel_path)
+        if options['max_bytes'] and size > options['max_bytes']:
+            return 'too_large'
+        if options['skip_names']:
+            name = rel_path.rsplit('/', 1)[-1]
+            for pattern, reason in SKIPPED_NAMES.items():
+                if fnmatch.fnmatchcase(name, pattern):
+                    return reason
+        return None
+
+    def check_content(self, rel_path, data):
+        """Skip reason from the file's contents."""
+        options = self.options(rel_path)
+        head = data[:self.sniff_bytes]
+        if options['binary'] and head:
+            if b'\0' in head or len(head.translate(None, _NON_TEXT)) < len(head) * (1 - BINARY_MAX_NON_TEXT_RATIO):
+                return 'binary'
+        if options['generated'] and is_generated(data):
+            return 'generated'
+        if options['minified'] and len(data) >= MINIFIED_MIN_BYTES:
+            lines = data.count(b'\n') + 1
+            if len(data) / lines > options['max_average_line_length']:
+                return 'minified'
+            if max(len(line) for line in data.split(b'\n')) > options['max_line_length']:
+                return 'minified'
+        return None
@@ -0,0 +1,84 @@
+import logging
+import subprocess
+
+logger = logging.getLogger(__name__)
+
+# Mounted checkouts are usually owned by another user; git would refuse to read them
+GIT_COMMAND = ['git', '-c', 'safe.directory=*']
+
+
+def _git(root, *args):
+    """Run a git command in ``root`` and return its stdout, or None if it failed."""
+    try:
+        result = subprocess.run(
+            GIT_COMMAND + ['-C', root] + list(args),
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=60
+        )
+    except (OSError, subprocess.SubprocessError) as e:
+        logger.debug(f"git {args[0]} failed: {e}")
+        return None
+    if result.returncode != 0:
+        logger.debug(f"git {args[0]} failed: {result.stderr.decode('utf-8', 'replace').strip()}")
+        return None
+    return result.stdout.decode('utf-8', 'surrogateescape')
+
+
+def _split_z(output):
+    return [part for part in output.split('\0') if part]
+
+
+def head_commit(root):
+    """SHA of the checked-out commit, or None if ``root`` is not a git checkout."""
+    output = _git(root, 'rev-parse', '--verify', '--quiet', 'HEAD')
+    return output.strip() if output else None
+
+
+def current_branch(root):
+    """Name of the checked-out branch, or None for a detached HEAD or no checkout."""
+    output = _git(root, 'symbolic-ref', '--quiet', '--short', 'HEAD')
+    return output.strip() if output else None
+
+
+def local_branches(root):
+    """Names of the checkout's local branches, or None if ``root`` is not a git checkout."""
+    output = _git(root, 'for-each-ref', '--format=%(refname:short)', 'refs/heads/')
+    return set(output.split()) if output is not None else None
+
+
+def commit_exists(root, commit):
+    return _git(root, 'cat-file', '-e', f"{commit}^{{commit}}") is not None
+
+
+def untracked_paths(root):
+    """Untracked, non-ignored paths; wholly untracked directories are listed once."""
+    output = _git(root, 'ls-files', '--others', '--exclude-standard', '--directory', '-z')
+    if output is None:
+        return None
+    return {path.rstrip('/') for path in _split_z(output)}
+
+
+def changed_since(root, commit):
+    """Paths that differ between ``commit`` and the working tree.
+
+    Covers committed, staged and unstaged modifications, both sides of
+    renames, deletions and untracked files. Returns None when the answer
+    is unknown (not a checkout, or ``commit`` is no longer reachable), in
+    which case the caller has to fall back to a full scan.
+    """
+    if not commit or not commit_exists(root, commit):
+        return None
+    output = _git(root, 'diff', '--name-status', '-z', '-M', '--no-ext-diff', commit, '--')
+    untracked = untracked_paths(root)
+    if output is None or untracked is None:
+        return None
+
+    paths = set(untracked)
+    fields = _split_z(output)
+    i = 0
+    while i < len(fields):
+        status = fields[i]
+        # Renames and copies list the old and the new path
+        count = 2 if status[0] in 'RC' else 1
+        paths.update(fields[i + 1:i + 1 + count])
+        i += 1 + count
+    return paths
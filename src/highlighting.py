@@ -0,0 +1,66 @@
+import hashlib
+import logging
+import time
+from functools import lru_cache
+from threading import Lock
+
+from pygments import highlight
+from pygments.formatters import HtmlFormatter
+from pygments.lexers import get_lexer_by_name
+from pygments.util import ClassNotFound
+
+from src.chunker import language_for_path
+from src.query_cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+
+@lru_cache(maxsize=128)
+def _lexer(language):
+    """Shared lexer for a Pygments alias; plain text if Pygments has none."""
+    try:
+        # startinline lets PHP chunks without an opening <?php tag highlight as code
+        return get_lexer_by_name(language, stripall=True, startinline=True)
+    except ClassNotFound:
+        return get_lexer_by_name('text', stripall=True)
+
+
+@lru_cache(maxsize=1024)
+def _formatter(line_start):
+    return HtmlFormatter(linenos=True, linenostart=line_start, cssclass="source", style="monokai")
+
+
+class Highlighter:
+    """Renders code snippets to highlighted HTML, caching the output.
+
+    The lexer is picked from the file's extension, and lexers and formatters
+    are built once and reused. Rendered HTML is kept in an LRU cache keyed
+    by the snippet's hash, its language and its first line number, so a
+    chunk that shows up in many result pages is only highlighted once.
+    """
+
+    def __init__(self, max_entries=2048):
+        self.cache = LRUCache(max_entries)
+        self.lock = Lock()
+        self.rendered = 0
+        self.render_seconds = 0.0
+
+    def render(self, code, path, line_start=1):
+        language = language_for_path(path)
+        key = (hashlib.sha1(code.encode('utf-8', 'surrogatepass')).hexdigest(), language, line_start)
+        html = self.cache.get(key)
+        if html is not None:
+            return html
+        started = time.perf_counter()
+        html = highlight(code, _lexer(language), _formatter(line_start))
+        with self.lock:
+            self.rendered += 1
+            self.render_seconds += time.perf_counter() - started
+        self.cache.put(key, html)
+        return html
+
+    def stats(self):
+        stats = self.cache.stats()
+        stats['rendered'] = self.rendered
+        stats['render_seconds'] = round(self.render_seconds, 3)
+        return stats
@@ -0,0 +1,188 @@
+import itertools
+import logging
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+
+class JobCancelled(Exception):
+    """Raised inside a running job once it has been asked to stop."""
+
+
+class Job:
+    """One indexing job for a repository; ``kind`` is 'reindex' or 'rebuild'."""
+
+    def __init__(self, job_id, repo, kind):
+        self.id = job_id
+        self.repo = repo
+        self.kind = kind
+        self.state = 'queued'
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.cancel_event = threading.Event()
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'repo': self.repo,
+            'kind': self.kind,
+            'state': self.state,
+            'error': self.error,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at
+        }
+
+
+class JobScheduler:
+    """Run indexing jobs on at most ``max_workers`` threads.
+
+    Jobs for one repository never run at the same time, and each repository
+    has at most one job waiting: submitting again returns the waiting job
+    (a rebuild upgrades a waiting reindex), so the queue never holds more
+    than one job per repository. Waiting jobs are cancelled outright; running
+    jobs get their ``cancel_event`` set and are expected to raise
+    JobCancelled at the next safe point.
+    """
+
+    def __init__(self, run_job, max_workers=2, history_size=50):
+        self.run_job = run_job
+        self.max_workers = max_workers
+        self.condition = threading.Condition()
+        self.queue = deque()
+        self.running = {}  # repo -> job
+        self.history = deque(maxlen=history_size)
+        self.ids = itertools.count(1)
+        self.workers = []
+
+    def submit(self, repo, kind='reindex'):
+        """Queue a job for ``repo``; returns (job, created)."""
+        with self.condition:
+            for job in self.queue:
+                if job.repo == repo:
+                    if kind == 'rebuild':
+                        job.kind = 'rebuild'
+                    return job, False
+            job = Job(next(self.ids), repo, kind)
+            self.queue.append(job)
+            # Workers start on first use so importing the app starts no threads
+            while len(self.workers) < self.max_workers:
+                worker = threading.Thread(
+                    target=self._work, name=f"index-job-{len(self.workers) + 1}", daemon=True
+                )
+                self.workers.append(worker)
+                worker.start()
+            self.condition.notify_all()
+            logger.info(f"Queued {kind} job {job.id} for {repo}")
+            return job, True
+
+    def cancel(self, job_id):
+        """Cancel a waiting or running job; returns it, or None if it is not active."""
+        with self.condition:
+            for job in self.queue:
+                if job.id == job_id:
+                    self.queue.remove(job)
+                    job.state = 'cancelled'
+                    job.finished_at = time.time()
+                    self.history.append(job)
+                    return job
+            for job in self.running.values():
+                if job.id == job_id:
+                    job.state = 'cancelling'
+                    job.cancel_event.set()
+                    return job
+        return None
+
+    def active(self, repo):
+        """The running or waiting job for ``repo``, if any."""
+        with self.condition:
+            if repo in self.running:
+                return self.running[repo]
+            return next((job for job in self.queue if job.repo == repo), None)
+
+    def jobs(self):
+        """Running, waiting and recently finished jobs, newest first within each group."""
+        with self.condition:
+            return {
+                'running': [job.to_dict() for job in self.running.values()],
+                'queued': [job.to_dict() for job in self.queue],
+                'finished': [job.to_dict() for job in reversed(self.history)]
+            }
+
+    def _next_job(self):
+        # Oldest waiting job whose repository is not being indexed already
+        for job in self.queue:
+            if job.repo not in self.running:
+                self.queue.remove(job)
+                return job
+        return None
+
+    def _work(self):
+        while True:
+            with self.condition:
+                job = self._next_job()
+                while job is None:
+                    self.condition.wait()
+                    job = self._next_job()
+                job.state = 'running'
+                job.started_at = time.time()
+                self.running[job.repo] = job
+            try:
+                self.run_job(job)
+                job.state = 'complete'
+            except JobCancelled:
+                logger.info(f"Job {job.id} for {job.repo} cancelled")
+                job.state = 'cancelled'
+            except Exception as e:
+                logger.error(f"Job {job.id} for {job.repo} failed: {e}")
+                job.state = 'error'
+                job.error = str(e)
+            finally:
+                with self.condition:
+                    job.finished_at = time.time()
+                    del self.running[job.repo]
+                    self.history.append(job)
+                    self.condition.notify_all()
+
+
+class FairSemaphore:
+    """Counting semaphore that hands freed slots to the longest-waiting thread.
+
+    With threading.Semaphore a thread that releases and immediately
+    re-acquires usually wins the slot again, so one busy indexing job could
+    hold the embedding model for its whole run. Here the jobs take turns
+    per batch.
+    """
+
+    def __init__(self, slots):
+        self.lock = threading.Lock()
+        self.free = slots
+        self.waiters = deque()
+
+    def acquire(self):
+        with self.lock:
+            if self.free and not self.waiters:
+                self.free -= 1
+                return
+            ready = threading.Event()
+            self.waiters.append(ready)
+        # The releasing thread passes its slot on directly
+        ready.wait()
+
+    def release(self):
+        with self.lock:
+            if self.waiters:
+                self.waiters.popleft().set()
+            else:
+                self.free += 1
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
@@ -0,0 +1,191 @@
+import json
+import logging
+import math
+import os
+import re
+from collections import Counter
+from threading import Lock
+
+from src.search_filters import FILTER_FIELDS, matches
+
+logger = logging.getLogger(__name__)
+
+LEXICAL_INDEX_VERSION = 2
+
+# Identifiers (with $ for PHP/JS) and numbers
+TOKEN_PATTERN = re.compile(r'[A-Za-z_$][A-Za-z0-9_$]*|\d+')
+# camelCase / PascalCase / snake_case parts of an identifier: 'parseHTTPResponse' -> parse, HTTP, Response
+SUBWORD_PATTERN = re.compile(r'[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|\d+')
+# A query that is a single (possibly qualified) identifier, e.g. S3Client, validate_jwt, $user->id
+IDENTIFIER_QUERY = re.compile(r'[A-Za-z_$][\w$]*(?:(?:\.|::|->|\\)[A-Za-z_$][\w$]*)*')
+
+
+def tokenize(text):
+    """Lower-cased identifiers of ``text``, each followed by its parts if it is compound."""
+    tokens = []
+    for match in TOKEN_PATTERN.finditer(text):
+        word = match.group()
+        tokens.append(word.lower().lstrip('$'))
+        parts = SUBWORD_PATTERN.findall(word)
+        if len(parts) > 1:
+            tokens.extend(part.lower() for part in parts)
+    return tokens
+
+
+def is_identifier_query(query):
+    """True for queries that look like code identifiers rather than prose."""
+    query = query.strip()
+    if not IDENTIFIER_QUERY.fullmatch(query):
+        return False
+    # A lone lower-case word ('authentication') is better served semantically
+    return any(c in query for c in '_$.:>\\') or any(c.isdigit() for c in query) or query != query.lower()
+
+
+class LexicalIndex:
+    """In-process BM25 index over the indexed chunks, keyed by point ID.
+
+    Built in the same pass as the vectors and persisted next to them as
+    ``path`` (a JSON file with each chunk's term frequencies and filter
+    fields; postings are rebuilt on load). Safe for concurrent readers and
+    one writer.
+    """
+
+    def __init__(self, path, k1=1.2, b=0.75):
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self.lock = Lock()
+        # Serialises saves, so an older snapshot never overwrites a newer one
+        self._save_lock = Lock()
+        self.docs = {}      # point id -> {term: frequency}
+        self.fields = {}    # point id -> filterable metadata (see src.search_filters)
+        self.lengths = {}   # point id -> number of tokens
+        self.postings = {}  # term -> {point id: frequency}
+        self.total_length = 0
+        self._dirty = False
+
+    @classmethod
+    def load(cls, path):
+        """Open a persisted index, or an empty one if there is none yet."""
+        index = cls(path)
+        if not os.path.exists(path):
+            return index
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not read lexical index {path}, starting empty: {e}")
+            return index
+        if data.get('version') != LEXICAL_INDEX_VERSION:
+            logger.warning(f"Ignoring lexical index with unsupported version: {data.get('version')}")
+            return index
+        fields = data.get('fields', {})
+        for point_id, terms in data['docs'].items():
+            index._add_terms(point_id, terms, fields.get(point_id, {}))
+        logger.info(f"Loaded lexical index with {len(index.docs)} chunks from {path}")
+        return index
+
+    @staticmethod
+    def exists(path):
+        return os.path.exists(path)
+
+    def __len__(self):
+        return len(self.docs)
+
+    def _add_terms(self, point_id, terms, fields):
+        self.docs[point_id] = terms
+        self.fields[point_id] = fields
+        length = sum(terms.values())
+        self.lengths[point_id] = length
+        self.total_length += length
+        for term, frequency in terms.items():
+            self.postings.setdefault(term, {})[point_id] = frequency
+
+    def _remove(self, point_id):
+        terms = self.docs.pop(point_id, None)
+        if terms is None:
+            return
+        self.fields.pop(point_id, None)
+        self.total_length -= self.lengths.pop(point_id)
+        for term in terms:
+            posting = self.postings.get(term)
+            if posting is not None:
+                posting.pop(point_id, None)
+                if not posting:
+                    del self.postings[term]
+
+    def add(self, ids, texts, metadatas=None):
+        """Index (or re-index) chunks; the filter fields of ``metadatas`` are kept."""
+        metadatas = metadatas or [{} for _ in ids]
+        counted = [
+            (point_id, dict(Counter(tokenize(text))),
+             {field: metadata[field] for field in FILTER_FIELDS if field in metadata})
+            for point_id, text, metadata in zip(ids, texts, metadatas)
+        ]
+        with self.lock:
+            for point_id, terms, fields in counted:
+                self._remove(point_id)
+                self._add_terms(point_id, terms, fields)
+            self._dirty = True
+
+    def delete(self, ids):
+        with self.lock:
+            for point_id in ids:
+                self._remove(point_id)
+            self._dirty = True
+
+    def search(self, query, k=10, conditions=()):
+        """Top ``k`` (point id, BM25 score) pairs for the query's terms.
+
+        ``conditions`` restricts the hits to chunks matching a search filter.
+        """
+        terms = set(tokenize(query))
+        with self.lock:
+            if not self.docs or not terms:
+                return []
+            n_docs = len(self.docs)
+            avg_length = self.total_length / n_docs or 1.0
+            scores = {}
+            for term in terms:
+                posting = self.postings.get(term)
+                if not posting:
+                    continue
+                idf = math.log(1 + (n_docs - len(posting) + 0.5) / (len(posting) + 0.5))
+                for point_id, frequency in posting.items():
+                    if conditions and not matches(self.fields[point_id], conditions):
+                        continue
+                    norm = self.k1 * (1 - self.b + self.b * self.lengths[point_id] / avg_length)
+                    scores[point_id] = scores.get(point_id, 0.0) + idf * frequency * (self.k1 + 1) / (frequency + norm)
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+
+    def save(self):
+        """Atomically write the index to ``path`` if it changed.
+
+        Searches wait only while the document maps are copied; their values
+        are replaced rather than mutated, so a shallow copy is a snapshot.
+        """
+        with self._save_lock:
+            with self.lock:
+                if not self._dirty and os.path.exists(self.path):
+                    return
+                data = {'version': LEXICAL_INDEX_VERSION, 'docs': dict(self.docs), 'fields': dict(self.fields)}
+                path = self.path
+                self._dirty = False
+            try:
+                os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+                tmp_path = f"{path}.tmp"
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(data, f)
+                os.replace(tmp_path, path)
+            except BaseException:
+                self._dirty = True
+                raise
+
+
+def reciprocal_rank_fusion(rankings, k=60):
+    """Fuse ranked lists of IDs; returns [(id, score)] best first."""
+    scores = {}
+    for ranking in rankings:
+        for rank, point_id in enumerate(ranking):
+            scores[point_id] = scores.get(point_id, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
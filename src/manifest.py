@@ -0,0 +1,133 @@
+import hashlib
+import json
+import logging
+import os
+import uuid
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_VERSION = 1
+
+
+def data_hash(data: bytes) -> str:
+    """Return the sha256 hex digest of a file's contents."""
+    return hashlib.sha256(data).hexdigest()
+
+
+def chunk_point_id(rel_path: str, index: int, content_hash: str) -> str:
+    """Deterministic vector store point ID for the index-th chunk of a file version."""
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, f"{rel_path}:{index}:{content_hash}"))
+
+
+class IndexManifest:
+    """Persistent record of indexed files: path -> content hash, mtime, size and point IDs.
+
+    The manifest is what makes reindexing incremental. A file whose size and
+    mtime match its entry is assumed unchanged without being read; a file whose
+    stat changed but whose hash did not only has its entry refreshed.
+
+    For git checkouts it also records the indexed commit and the paths that
+    were dirty at the time, so the next run can ask git what changed, plus a
+    digest of the file selection settings: git knows nothing about those, so
+    the next run scans everything when they differ.
+    """
+
+    def __init__(self, path: str, chunker: str = None):
+        self.path = path
+        self.chunker = chunker
+        self.files = {}
+        self.commit = None
+        self.dirty = []
+        # Digest of the settings that decide which files are indexed
+        self.settings = None
+        # Set when the stored chunks came from a different chunking scheme
+        self.rechunk = False
+
+    def load(self):
+        """Load the manifest from disk, starting empty if it is missing or unreadable."""
+        self.files = {}
+        self.commit = None
+        self.dirty = []
+        self.settings = None
+        self.rechunk = False
+        if not os.path.exists(self.path):
+            return self
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('version') == MANIFEST_VERSION:
+                self.files = data.get('files', {})
+                self.commit = data.get('commit')
+                self.dirty = data.get('dirty', [])
+                self.settings = data.get('settings')
+                if self.chunker and data.get('chunker') != self.chunker:
+                    # Files were chunked differently: keep the point IDs so they can be
+                    # deleted, but forget the hashes so every file is re-chunked
+                    logger.info("Chunking scheme changed, all files will be re-indexed")
+                    for entry in self.files.values():
+                        entry['hash'] = None
+                        entry['mtime'] = None
+                    self.commit = None
+                    self.rechunk = True
+            else:
+                logger.warning(f"Ignoring manifest with unsupported version: {data.get('version')}")
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not read manifest {self.path}, starting fresh: {e}")
+        return self
+
+    def save(self):
+        """Atomically write the manifest to disk."""
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'version': MANIFEST_VERSION,
+                'chunker': self.chunker,
+                'commit': self.commit,
+                'dirty': self.dirty,
+                'settings': self.settings,
+                'files': self.files
+            }, f)
+        os.replace(tmp_path, self.path)
+
+    def clear(self):
+        """Forget every entry and remove the manifest file."""
+        self.files = {}
+        self.commit = None
+        self.dirty = []
+        self.settings = None
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+    def get(self, rel_path):
+        return self.files.get(rel_path)
+
+    def set(self, rel_path, content_hash, mtime, size, point_ids):
+        self.files[rel_path] = {
+            'hash': content_hash,
+            'mtime': mtime,
+            'size': size,
+            'point_ids': list(point_ids)
+        }
+
+    def remove(self, rel_path):
+        """Drop a file's entry and return the point IDs it owned."""
+        entry = self.files.pop(rel_path, None)
+        return entry['point_ids'] if entry else []
+
+    def is_unchanged(self, rel_path, stat_result) -> bool:
+        """True if the file's size and mtime match its recorded entry."""
+        entry = self.files.get(rel_path)
+        return (
+            entry is not None
+            and entry['size'] == stat_result.st_size
+            and entry['mtime'] == stat_result.st_mtime
+        )
+
+    def __contains__(self, rel_path):
+        return rel_path in self.files
+
+    def __len__(self):
+        return len(self.files)
@@ -0,0 +1,253 @@
+import math
+import time
+from collections import deque
+from itertools import islice
+from contextlib import contextmanager
+from threading import Lock
+
+# Latency buckets in seconds, from sub-millisecond cache hits to slow batches
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Counter:
+    """Monotonically increasing total."""
+
+    kind = 'counter'
+
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help = help_text
+        self.lock = Lock()
+        self.value = 0.0
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+    def samples(self):
+        return [(self.name, self.value)]
+
+
+class Gauge(Counter):
+    """Value that can go up and down."""
+
+    kind = 'gauge'
+
+    def set(self, value):
+        with self.lock:
+            self.value = value
+
+
+class CounterFamily:
+    """Counters sharing one name, one per value of a single label."""
+
+    kind = 'counter'
+
+    def __init__(self, name, help_text, label):
+        self.name = name
+        self.help = help_text
+        self.label = label
+        self.lock = Lock()
+        self.children = {}
+
+    def labels(self, value):
+        with self.lock:
+            if value not in self.children:
+                self.children[value] = Counter(f'{self.name}{{{self.label}="{value}"}}', self.help)
+            return self.children[value]
+
+    def samples(self):
+        with self.lock:
+            children = sorted(self.children.items())
+        return [sample for _, child in children for sample in child.samples()]
+
+
+class Histogram:
+    """Distribution of observed durations in cumulative buckets, plus their sum and count."""
+
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.lock = Lock()
+        self.buckets = tuple(buckets) + (math.inf,)
+        self.counts = [0] * len(self.buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        with self.lock:
+            self.sum += value
+            self.count += 1
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    self.counts[i] += 1
+                    break
+
+    @contextmanager
+    def time(self):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started)
+
+    def samples(self):
+        with self.lock:
+            counts, total, count = list(self.counts), self.sum, self.count
+        samples = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets, counts):
+            cumulative += bucket_count
+            samples.append((f'{self.name}_bucket{{le="{_format_value(bound)}"}}', cumulative))
+        samples.append((f"{self.name}_sum", total))
+        samples.append((f"{self.name}_count", count))
+        return samples
+
+
+class MetricsRegistry:
+    """Named counters, gauges and histograms rendered in the Prometheus text format."""
+
+    def __init__(self, prefix=''):
+        self.prefix = prefix
+        self.lock = Lock()
+        self.metrics = {}
+
+    def _register(self, cls, name, help_text, **kwargs):
+        name = self.prefix + name
+        with self.lock:
+            if name not in self.metrics:
+                self.metrics[name] = cls(name, help_text, **kwargs)
+            return self.metrics[name]
+
+    def counter(self, name, help_text):
+        return self._register(Counter, name, help_text)
+
+    def counter_family(self, name, help_text, label):
+        return self._register(CounterFamily, name, help_text, label=label)
+
+    def gauge(self, name, help_text):
+        return self._register(Gauge, name, help_text)
+
+    def histogram(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram, name, help_text, buckets=buckets)
+
+    def render(self):
+        lines = []
+        with self.lock:
+            metrics = list(self.metrics.values())
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(f"{name} {_format_value(value)}" for name, value in metric.samples())
+        return '\n'.join(lines) + '\n'
+
+
+class IndexingProgress(dict):
+    """Progress of the running (or last) indexing pass, as shown on /admin/progress.
+
+    A dict so existing code can keep updating fields directly; ``start``,
+    ``begin_files`` and ``finish`` mark the stages of a run, and ``snapshot``
+    adds rates and an ETA from the time spent on files so far.
+
+    Processed paths go to a bounded log numbered from 0 within each run
+    (``run`` changes on every ``start``). Clients page through it with
+    ``files_since`` and a cursor, so a poll only carries the files that are
+    new to it; entries that fell out of the log are reported as skipped.
+    Files left out by the pre-filter are counted per reason in ``skipped``,
+    and the latest of them are kept with their reasons in ``skip_log``.
+    """
+
+    def __init__(self, file_log_size=10_000, skip_log_size=1000):
+        super().__init__(current=0, total=0, status='idle', message='', phase='idle', skipped={})
+        self.lock = Lock()
+        self.run = 0
+        self.file_log = deque(maxlen=file_log_size)
+        self.files_logged = 0
+        self.skip_log = deque(maxlen=skip_log_size)
+        self.started_at = None
+        self.files_started_at = None
+        self.finished_at = None
+
+    def start(self, **fields):
+        self.update(current=0, total=0, chunks_indexed=0, cache_hit_rate=0.0, skipped={}, **fields)
+        with self.lock:
+            self.run += 1
+            self.file_log.clear()
+            self.files_logged = 0
+            self.skip_log.clear()
+        self.started_at = time.monotonic()
+        self.files_started_at = self.finished_at = None
+
+    def begin_files(self, total):
+        self.update(total=total, current=0, chunks_indexed=0, cache_hit_rate=0.0)
+        self.files_started_at = time.monotonic()
+
+    def file_done(self, rel_path):
+        with self.lock:
+            self['current'] += 1
+            self.file_log.append(rel_path)
+            self.files_logged += 1
+
+    def file_skipped(self, rel_path, reason):
+        with self.lock:
+            skipped = self['skipped']
+            skipped[reason] = skipped.get(reason, 0) + 1
+            self.skip_log.append({'path': rel_path, 'reason': reason})
+
+    def skipped_files(self):
+        """The most recently skipped files with their reasons, oldest first."""
+        with self.lock:
+            return list(self.skip_log)
+
+    def finish(self, **fields):
+        self.update(**fields)
+        self.finished_at = time.monotonic()
+
+    @property
+    def done(self):
+        return self.finished_at is not None
+
+    def files_since(self, cursor=None, limit=500):
+        """Paths logged from ``cursor`` on (the latest ``limit`` if None), with the next cursor."""
+        with self.lock:
+            first = self.files_logged - len(self.file_log)
+            if cursor is None or cursor > self.files_logged:
+                cursor = max(first, self.files_logged - limit)
+            start = max(cursor, first)
+            files = list(islice(self.file_log, start - first, start - first + limit))
+            return {
+                'run': self.run,
+                'files': files,
+                'cursor': start + len(files),
+                'skipped': start - cursor
+            }
+
+    def snapshot(self):
+        """Counters, rates and ETA for the run; no file paths."""
+        with self.lock:
+            snapshot = dict(self, skipped=dict(self['skipped']))
+        snapshot['run'] = self.run
+        snapshot['cursor'] = self.files_logged
+        end = self.finished_at or time.monotonic()
+        elapsed = end - self.started_at if self.started_at is not None else 0.0
+        files_elapsed = end - self.files_started_at if self.files_started_at is not None else 0.0
+        current, total = self.get('current', 0), self.get('total', 0)
+        snapshot['elapsed_seconds'] = round(elapsed, 1)
+        snapshot['files_per_second'] = round(current / files_elapsed, 2) if files_elapsed else 0.0
+        snapshot['chunks_per_second'] = (
+            round(self.get('chunks_indexed', 0) / files_elapsed, 2) if files_elapsed else 0.0
+        )
+        snapshot['eta_seconds'] = None
+        if self.finished_at is None and current and total > current:
+            snapshot['eta_seconds'] = round((total - current) * files_elapsed / current, 1)
+        return snapshot
@@ -0,0 +1,159 @@
+import logging
+import queue
+import threading
+from collections import deque
+from concurrent.futures import Future
+
+logger = logging.getLogger(__name__)
+
+# Chunker installed in each split worker process by init_split_worker
+_worker_chunker = None
+
+
+def init_split_worker(chunker):
+    """ProcessPoolExecutor initializer: keep one chunker per worker process."""
+    global _worker_chunker
+    _worker_chunker = chunker
+
+
+def split_in_worker(code, filename):
+    """Split a file in a worker process using the chunker from init_split_worker."""
+    return _worker_chunker.split(code, filename)
+
+
+def completed_future(value):
+    """A Future that already holds ``value``, for items that need no pool work."""
+    future = Future()
+    future.set_result(value)
+    return future
+
+
+def ordered_map(submit, items, window):
+    """Yield (item, result) for each item, in input order, with at most ``window`` tasks in flight.
+
+    ``submit`` takes an item and returns a Future. Unlike Executor.map this
+    consumes ``items`` lazily, so a generator over a huge tree never gets
+    submitted all at once.
+    """
+    pending = deque()
+    for item in items:
+        pending.append((item, submit(item)))
+        if len(pending) >= window:
+            item, future = pending.popleft()
+            yield item, future.result()
+    while pending:
+        item, future = pending.popleft()
+        yield item, future.result()
+
+
+_DONE = object()
+
+
+def iter_in_background(iterable, maxsize=32, name='index-producer'):
+    """Drive ``iterable`` from a producer thread and yield its items through a bounded queue.
+
+    This lets the consumer (embedding) and the producer (reading and
+    splitting) run at the same time. Exceptions raised by the producer are
+    re-raised in the consumer; if the consumer stops early the producer is
+    told to stop as well.
+    """
+    items = queue.Queue(maxsize=maxsize)
+    stop = threading.Event()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                items.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for item in iterable:
+                if not put((item, None)):
+                    return
+        except BaseException as e:
+            put((_DONE, e))
+            return
+        put((_DONE, None))
+
+    producer = threading.Thread(target=produce, name=name, daemon=True)
+    producer.start()
+    try:
+        while True:
+            item, error = items.get()
+            if item is _DONE:
+                if error is not None:
+                    raise error
+                return
+            yield item
+    finally:
+        stop.set()
+        producer.join()
+
+
+class UpsertBatcher:
+    """Buffer chunks from many files into fixed-size batches and write each batch as it fills.
+
+    Memory is bounded by one batch plus the chunks of the file currently being
+    added. A file is reported complete (via ``on_file_complete``) only once every
+    one of its chunks has been written, so callers can commit per-file state
+    such as manifest entries without ever recording a half-written file.
+    """
+
+    def __init__(self, upsert, batch_size=64, on_file_complete=None):
+        self.upsert = upsert
+        self.batch_size = batch_size
+        self.on_file_complete = on_file_complete or (lambda rel_path, entry: None)
+        self.texts = []
+        self.metadatas = []
+        self.ids = []
+        # (rel_path, entry, chunks not yet written) in the order they were added
+        self.pending_files = deque()
+        self.chunks_written = 0
+        self.batches_written = 0
+
+    def add_file(self, rel_path, texts, metadatas, ids, entry=None):
+        """Queue a file's chunks, writing full batches as they become available."""
+        if not texts:
+            self.pending_files.append([rel_path, entry, 0])
+            self._complete_written_files()
+            return
+        self.texts.extend(texts)
+        self.metadatas.extend(metadatas)
+        self.ids.extend(ids)
+        self.pending_files.append([rel_path, entry, len(texts)])
+        while len(self.texts) >= self.batch_size:
+            self._write(self.batch_size)
+
+    def flush(self):
+        """Write whatever is left in the buffer."""
+        while self.texts:
+            self._write(self.batch_size)
+        self._complete_written_files()
+
+    def _write(self, count):
+        batch_texts = self.texts[:count]
+        batch_metadatas = self.metadatas[:count]
+        batch_ids = self.ids[:count]
+        del self.texts[:count], self.metadatas[:count], self.ids[:count]
+
+        self.upsert(batch_texts, batch_metadatas, batch_ids)
+        self.chunks_written += len(batch_texts)
+        self.batches_written += 1
+
+        written = len(batch_texts)
+        for pending in self.pending_files:
+            if written == 0:
+                break
+            taken = min(written, pending[2])
+            pending[2] -= taken
+            written -= taken
+        self._complete_written_files()
+
+    def _complete_written_files(self):
+        while self.pending_files and self.pending_files[0][2] == 0:
+            rel_path, entry, _ = self.pending_files.popleft()
+            self.on_file_complete(rel_path, entry)
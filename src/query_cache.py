@@ -0,0 +1,90 @@
+import re
+import time
+from collections import OrderedDict
+from threading import Lock
+
+
+def normalise_query(query: str) -> str:
+    """Canonical form of a query for cache keys: trimmed, single-spaced, lowercased.
+
+    Lowercasing is safe because the embedding model's tokenizer is uncased.
+    """
+    return re.sub(r'\s+', ' ', query).strip().lower()
+
+
+class LRUCache:
+    """Thread-safe, size-bounded LRU cache with an optional time-to-live."""
+
+    def __init__(self, maxsize=256, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.lock = Lock()
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()  # key -> (value, stored_at)
+
+    def get(self, key, default=None):
+        with self.lock:
+            item = self._data.get(key)
+            if item is not None and self.ttl is not None and time.monotonic() - item[1] > self.ttl:
+                del self._data[key]
+                item = None
+            if item is None:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[0]
+
+    def put(self, key, value):
+        with self.lock:
+            self._data[key] = (value, time.monotonic())
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'size': len(self._data),
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0
+        }
+
+
+class QueryCache:
+    """Caches query vectors and final result lists for /query.
+
+    Vectors only depend on the model, so they are keyed by the normalised
+    query. Result lists also depend on the index contents, so their keys
+    include ``generation``, which is bumped whenever the index changes.
+    """
+
+    def __init__(self, max_vectors=1024, max_results=256, ttl=600):
+        self.vectors = LRUCache(max_vectors, ttl)
+        self.results = LRUCache(max_results, ttl)
+        self.generation = 0
+
+    def invalidate(self):
+        """Forget every cached result; called whenever the index changes."""
+        self.generation += 1
+        self.results.clear()
+
+    def result_key(self, query, k, *extra):
+        return (normalise_query(query), k, self.generation) + extra
+
+    def stats(self):
+        return {
+            'generation': self.generation,
+            'vectors': self.vectors.stats(),
+            'results': self.results.stats()
+        }
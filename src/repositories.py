@@ -0,0 +1,88 @@
+import json
+import logging
+import os
+import re
+from threading import Lock
+
+logger = logging.getLogger(__name__)
+
+# Repository names become part of collection names, so they are kept simple;
+# doubled separators are refused so no name can look like '<name>__<branch>'
+REPOSITORY_NAME_PATTERN = re.compile(r'[a-z0-9]+(?:[_-][a-z0-9]+)*')
+
+DEFAULT_REPOSITORY = 'default'
+
+
+class Repository:
+    """One indexed repository: where it lives, how it is indexed and what is served for it.
+
+    Every repository has its own collection (``collection`` plus the branch
+    snapshots and builds named after it), its own settings, progress and
+    locks, so indexing one never blocks queries or indexing of another.
+    """
+
+    def __init__(self, name, path, collection, settings, progress):
+        self.name = name
+        self.path = path
+        self.collection = collection
+        self.settings = settings
+        self.progress = progress
+        # Name of the index docsearch is serving
+        self.active_index = collection
+        # Vector store and lexical (BM25) index being served
+        self.docsearch = None
+        self.lexical_index = None
+        self.indexing_lock = Lock()
+        self.docsearch_lock = Lock()
+        self.watcher = None
+
+    def owns(self, index):
+        """True if ``index`` (a snapshot, build or file stem) belongs to this repository."""
+        return index == self.collection or index.startswith(f"{self.collection}__")
+
+    def describe(self):
+        return {
+            'name': self.name,
+            'path': self.path,
+            'collection': self.collection,
+            'active_index': self.active_index,
+            'indexed': self.docsearch is not None,
+            'status': self.progress['status'],
+            'settings': self.settings
+        }
+
+
+def load_repositories(config_path, default_path, collection_name, default_settings, progress_factory):
+    """Repositories from the JSON file at ``config_path``, in file order.
+
+    The file maps names to a ``path`` plus any settings that differ from
+    ``default_settings``::
+
+        {"default": {"path": "/app/repo"},
+         "api": {"path": "/app/repos/api", "file_patterns": [".go"]}}
+
+    Without the file there is one repository, 'default', at ``default_path``.
+    The 'default' repository keeps ``collection_name`` as its collection so
+    existing indexes stay valid; others get ``<collection_name>_<name>``.
+    """
+    config = {DEFAULT_REPOSITORY: {'path': default_path}}
+    if config_path and os.path.exists(config_path):
+        with open(config_path, 'r', encoding='utf-8') as f:
+            config = json.load(f)
+        if not isinstance(config, dict) or not config:
+            raise ValueError(f"{config_path} must map repository names to their settings")
+
+    repositories = {}
+    for name, options in config.items():
+        if not REPOSITORY_NAME_PATTERN.fullmatch(name):
+            raise ValueError(
+                f"Invalid repository name {name!r}: use lowercase letters, digits and single '-' or '_'"
+            )
+        if not options.get('path'):
+            raise ValueError(f"Repository {name!r} has no path")
+        settings = dict(default_settings)
+        settings.update((key, value) for key, value in options.items() if key != 'path')
+        collection = collection_name if name == DEFAULT_REPOSITORY else f"{collection_name}_{name}"
+        repositories[name] = Repository(name, options['path'], collection, settings, progress_factory())
+    logger.info(f"Configured repositories: {', '.join(repositories)}")
+    return repositories
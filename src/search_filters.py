@@ -0,0 +1,67 @@
+import os
+
+from qdrant_client.http import models as rest
+
+from src.chunker import language_for_path
+
+# Metadata fields every chunk carries for filtering; each gets a Qdrant payload index
+FILTER_FIELDS = ('path_prefixes', 'ext', 'lang')
+
+
+def path_prefixes(rel_path):
+    """Directories containing a file, outermost first: 'a/b/c.py' -> ['a', 'a/b']."""
+    parts = rel_path.split('/')[:-1]
+    return ['/'.join(parts[:i]) for i in range(1, len(parts) + 1)]
+
+
+def chunk_fields(rel_path):
+    """Filterable metadata shared by all chunks of a file."""
+    return {
+        'path_prefixes': path_prefixes(rel_path),
+        'ext': os.path.splitext(rel_path)[1].lower(),
+        'lang': language_for_path(rel_path)
+    }
+
+
+def _split(value):
+    return [part.strip() for part in (value or '').split(',') if part.strip()]
+
+
+def parse_filters(path=None, ext=None, lang=None):
+    """Build search conditions from comma-separated query parameters.
+
+    Conditions are a tuple of (field, allowed values) pairs; a chunk matches
+    when every condition has at least one of its values.
+    """
+    conditions = []
+    paths = [p.strip('/') for p in _split(path) if p.strip('/')]
+    if paths:
+        conditions.append(('path_prefixes', tuple(paths)))
+    exts = [e.lower() if e.startswith('.') else f".{e.lower()}" for e in _split(ext)]
+    if exts:
+        conditions.append(('ext', tuple(exts)))
+    langs = [l.lower() for l in _split(lang)]
+    if langs:
+        conditions.append(('lang', tuple(langs)))
+    return tuple(conditions)
+
+
+def value_matches(value, allowed):
+    """A scalar matches if it is allowed; a list matches if any element is."""
+    if isinstance(value, (list, tuple)):
+        return any(v in allowed for v in value)
+    return value in allowed
+
+
+def matches(metadata, conditions):
+    return all(value_matches(metadata.get(field), values) for field, values in conditions)
+
+
+def qdrant_filter(conditions, metadata_key='metadata'):
+    """The conditions as a Qdrant filter on the chunks' metadata payload, or None."""
+    if not conditions:
+        return None
+    return rest.Filter(must=[
+        rest.FieldCondition(key=f"{metadata_key}.{field}", match=rest.MatchAny(any=list(values)))
+        for field, values in conditions
+    ])
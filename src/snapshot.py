@@ -0,0 +1,123 @@
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+import zipfile
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_FORMAT = 'code-rag-snapshot'
+SNAPSHOT_VERSION = 1
+
+# Storage precision of the vectors in a snapshot file
+SNAPSHOT_DTYPES = ('float16', 'float32')
+
+
+def write_snapshot(path, store, manifest_path, header, dtype='float16', batch_size=1000):
+    """Stream every point of ``store`` into a snapshot file at ``path``; returns the header written.
+
+    A snapshot is a zip archive holding ``snapshot.json`` (format version,
+    embedding model, dimension, point count and whatever else ``header``
+    carries), ``vectors.npy`` (an (n, dimension) array in ``dtype``),
+    ``chunks.jsonl`` (the ID, text and metadata of row i on line i) and
+    ``manifest.json`` (the file manifest, if there is one). Points are
+    read and written a batch at a time, so memory stays flat however large
+    the index is. The file only appears at ``path`` once it is complete.
+    """
+    if dtype not in SNAPSHOT_DTYPES:
+        raise ValueError(f"Unsupported snapshot dtype {dtype!r}, use one of {', '.join(SNAPSHOT_DTYPES)}")
+    count = store.count_points()
+    dimension = header['dimension']
+    tmp_path = f"{path}.tmp"
+    written = 0
+    try:
+        # Only one archive member can be open for writing, so chunks are spooled to a
+        # temporary file while the vectors are streamed into the archive
+        with zipfile.ZipFile(tmp_path, 'w', allowZip64=True) as archive, \
+                tempfile.TemporaryFile() as chunks:
+            with archive.open('vectors.npy', 'w', force_zip64=True) as vectors_file:
+                np.lib.format.write_array_header_1_0(vectors_file, {
+                    'descr': np.lib.format.dtype_to_descr(np.dtype(dtype)),
+                    'fortran_order': False,
+                    'shape': (count, dimension)
+                })
+                for ids, vectors, texts, metadatas in store.iter_points(batch_size):
+                    if vectors.shape[1] != dimension:
+                        raise ValueError(f"Index has {vectors.shape[1]}-dimensional vectors, expected {dimension}")
+                    vectors_file.write(np.ascontiguousarray(vectors, dtype=dtype).tobytes())
+                    for point_id, text, metadata in zip(ids, texts, metadatas):
+                        line = json.dumps({'id': point_id, 'text': text, 'metadata': metadata})
+                        chunks.write(line.encode('utf-8') + b'\n')
+                    written += len(ids)
+            if written != count:
+                raise RuntimeError(f"Index changed during export: expected {count} points, read {written}")
+
+            # Vectors barely compress; chunk text and metadata do
+            chunks.seek(0)
+            info = zipfile.ZipInfo('chunks.jsonl', date_time=time.localtime()[:6])
+            info.compress_type = zipfile.ZIP_DEFLATED
+            with archive.open(info, 'w', force_zip64=True) as member:
+                shutil.copyfileobj(chunks, member)
+            if manifest_path and os.path.exists(manifest_path):
+                archive.write(manifest_path, 'manifest.json', compress_type=zipfile.ZIP_DEFLATED)
+            header = dict(
+                header, format=SNAPSHOT_FORMAT, version=SNAPSHOT_VERSION, dtype=dtype, count=count,
+                created_at=time.strftime('%Y-%m-%dT%H:%M:%S%z')
+            )
+            archive.writestr('snapshot.json', json.dumps(header, indent=2))
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    os.replace(tmp_path, path)
+    logger.info(f"Wrote snapshot of {count} points to {path}")
+    return header
+
+
+def read_snapshot_header(path):
+    """The header of a snapshot file, after checking it is one this version can read."""
+    try:
+        with zipfile.ZipFile(path) as archive:
+            header = json.loads(archive.read('snapshot.json'))
+    except (OSError, KeyError, ValueError, zipfile.BadZipFile) as e:
+        raise ValueError(f"{path} is not a readable snapshot: {e}")
+    if header.get('format') != SNAPSHOT_FORMAT:
+        raise ValueError(f"{path} is not a snapshot file")
+    if header.get('version') != SNAPSHOT_VERSION:
+        raise ValueError(f"Unsupported snapshot version {header.get('version')}")
+    return header
+
+
+def read_snapshot_manifest(path):
+    """The manifest stored in a snapshot, as bytes, or None."""
+    with zipfile.ZipFile(path) as archive:
+        if 'manifest.json' not in archive.namelist():
+            return None
+        return archive.read('manifest.json')
+
+
+def iter_snapshot(path, batch_size=1000):
+    """Yield (ids, vectors, texts, metadatas) batches from a snapshot file, with float32 vectors."""
+    with zipfile.ZipFile(path) as archive, \
+            archive.open('vectors.npy') as vectors_file, archive.open('chunks.jsonl') as chunks_file:
+        np.lib.format.read_magic(vectors_file)
+        shape, _, dtype = np.lib.format.read_array_header_1_0(vectors_file)
+        count, dimension = shape
+        row_bytes = dimension * dtype.itemsize
+        for start in range(0, count, batch_size):
+            rows = min(batch_size, count - start)
+            data = vectors_file.read(rows * row_bytes)
+            if len(data) != rows * row_bytes:
+                raise ValueError(f"Snapshot {path} is truncated")
+            vectors = np.frombuffer(data, dtype=dtype).reshape(rows, dimension).astype(np.float32)
+            chunks = [json.loads(chunks_file.readline()) for _ in range(rows)]
+            yield (
+                [chunk['id'] for chunk in chunks],
+                vectors,
+                [chunk['text'] for chunk in chunks],
+                [chunk['metadata'] for chunk in chunks]
+            )
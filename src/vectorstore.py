@@ -0,0 +1,495 @@
+import json
+import logging
+import os
+import shutil
+from threading import Lock
+
+import numpy as np
+from langchain_community.vectorstores import Qdrant
+from langchain_core.documents import Document
+from langchain_core.vectorstores import VectorStore
+from qdrant_client.http import models as rest
+
+from src.search_filters import FILTER_FIELDS, qdrant_filter, value_matches
+
+logger = logging.getLogger(__name__)
+
+LOCAL_INDEX_VERSION = 1
+
+# Storage types for the vector matrix; int8 rows are normalised vectors scaled by INT8_SCALE
+VECTOR_FILES = {'float32': 'vectors.f32', 'float16': 'vectors.f16', 'int8': 'vectors.i8'}
+INT8_SCALE = 127.0
+
+# ``persist`` reclaims tombstoned rows once they make up this share of the matrix;
+# until then they are written out as tombstones (a null ID)
+COMPACT_DEAD_FRACTION = 0.2
+
+
+def _normalise(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def _kmeans(vectors, n_clusters, iterations=10, seed=0):
+    """Spherical k-means on normalised vectors; returns normalised centroids."""
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), n_clusters, replace=False)].copy()
+    for _ in range(iterations):
+        assignments = np.argmax(vectors @ centroids.T, axis=1)
+        for cluster in range(n_clusters):
+            members = vectors[assignments == cluster]
+            if len(members):
+                centroids[cluster] = members.sum(axis=0)
+        centroids = _normalise(centroids)
+    return centroids
+
+
+class QdrantStore(Qdrant):
+    """langchain Qdrant store that also accepts precomputed NumPy vectors."""
+
+    def add_vectors(self, vectors, texts, metadatas, ids):
+        """Upsert points from an (n, dimension) array without building Python lists first."""
+        payloads = self._build_payloads(texts, metadatas, self.content_payload_key, self.metadata_payload_key)
+        self.client.upload_collection(
+            collection_name=self.collection_name,
+            vectors=vectors,
+            payload=payloads,
+            ids=ids,
+            batch_size=len(ids),
+            wait=True
+        )
+        return list(ids)
+
+    def get_documents(self, ids):
+        """Fetch points by ID as Documents, in the order given; missing IDs are skipped."""
+        records = self.client.retrieve(self.collection_name, ids=list(ids), with_payload=True)
+        by_id = {str(record.id): record for record in records}
+        documents = []
+        for point_id in ids:
+            record = by_id.get(str(point_id))
+            if record is None:
+                continue
+            payload = record.payload or {}
+            metadata = dict(payload.get(self.metadata_payload_key) or {})
+            metadata['_id'] = record.id
+            documents.append(Document(page_content=payload.get(self.content_payload_key, ''), metadata=metadata))
+        return documents
+
+    def count_points(self):
+        return self.client.count(self.collection_name, exact=True).count
+
+    def iter_points(self, batch_size=1000):
+        """Yield (ids, vectors, texts, metadatas) for every point, in batches, with float32 vectors."""
+        offset = None
+        while True:
+            records, offset = self.client.scroll(
+                self.collection_name, limit=batch_size, offset=offset, with_payload=True, with_vectors=True
+            )
+            if records:
+                payloads = [record.payload or {} for record in records]
+                yield (
+                    [str(record.id) for record in records],
+                    np.asarray([record.vector for record in records], dtype=np.float32),
+                    [payload.get(self.content_payload_key, '') for payload in payloads],
+                    [dict(payload.get(self.metadata_payload_key) or {}) for payload in payloads]
+                )
+            if offset is None:
+                return
+
+    def similarity_search_with_score_by_vector(self, embedding, k=4, filter=None, **kwargs):
+        """Vector search; ``filter`` may be search conditions (see src.search_filters)."""
+        if isinstance(filter, tuple):
+            filter = qdrant_filter(filter, self.metadata_payload_key)
+        return super().similarity_search_with_score_by_vector(embedding, k=k, filter=filter, **kwargs)
+
+
+def create_qdrant_payload_indexes(client, collection_name):
+    """Keyword indexes on the filterable metadata so filtered searches stay fast."""
+    for field in FILTER_FIELDS:
+        client.create_payload_index(
+            collection_name, field_name=f"metadata.{field}", field_schema=rest.PayloadSchemaType.KEYWORD
+        )
+
+
+def qdrant_vector_params(dimension, dtype='float32'):
+    """Vector and quantization config for a new collection in the given storage dtype.
+
+    float16 stores half-precision vectors; int8 keeps float32 originals on disk
+    and searches an int8 scalar-quantized copy held in RAM.
+    """
+    vectors_config = rest.VectorParams(size=dimension, distance=rest.Distance.COSINE)
+    quantization_config = None
+    if dtype == 'float16':
+        vectors_config = rest.VectorParams(
+            size=dimension, distance=rest.Distance.COSINE, datatype=rest.Datatype.FLOAT16
+        )
+    elif dtype == 'int8':
+        vectors_config = rest.VectorParams(size=dimension, distance=rest.Distance.COSINE, on_disk=True)
+        quantization_config = rest.ScalarQuantization(
+            scalar=rest.ScalarQuantizationConfig(type=rest.ScalarType.INT8, always_ram=True)
+        )
+    return vectors_config, quantization_config
+
+
+class LocalVectorStore(VectorStore):
+    """In-process vector store backed by files under ``directory``.
+
+    Embeddings are L2-normalised and kept in a contiguous matrix that is
+    memory-mapped from ``vectors.f32`` (or ``.f16``/``.i8``); point IDs, texts and each metadata
+    field are stored as columns in ``meta.json``. Search is a vectorised
+    cosine top-k over the whole matrix, or, with ``index_type='ivf'``, over
+    the ``nprobe`` closest clusters of an inverted-file index once the store
+    holds at least ``ivf_min_points`` vectors.
+
+    The matrix can be stored as float16 or int8 (``dtype``) to halve or
+    quarter its size; rows are decoded to float32 only for the rows a search
+    scans. Deleted rows are tombstoned and reclaimed by ``persist`` once
+    there are enough of them. ``persist`` only holds the lock searches take
+    while it copies the columns, not while it writes them.
+
+    Searches can be restricted with metadata conditions (``filter``, see
+    src.search_filters); the row mask of each condition is cached until the
+    rows change.
+    """
+
+    def __init__(self, directory, embeddings, index_type='flat', nprobe=8, ivf_min_points=50_000,
+                 dtype='float32'):
+        if dtype not in VECTOR_FILES:
+            raise ValueError(f"Unsupported vector dtype: {dtype}")
+        self.directory = directory
+        self.dtype = dtype
+        self._embeddings = embeddings
+        self.index_type = index_type
+        self.nprobe = nprobe
+        self.ivf_min_points = ivf_min_points
+        self.lock = Lock()
+        # Serialises persists, so an older snapshot never overwrites a newer one
+        self._persist_lock = Lock()
+        # Set by every change that has not been persisted yet
+        self._dirty = False
+
+        self.dimension = None
+        self._vectors = None  # memmap (capacity, dimension)
+        self.count = 0        # rows in use, including tombstones
+        self.ids = []
+        self.texts = []
+        self.columns = {}     # metadata key -> list of values, one per row
+        self.live = np.zeros(0, dtype=bool)
+        self.row_by_id = {}
+        self._mask_cache = {}  # (field, values) -> bool mask over rows
+
+        # IVF state: centroids and the cluster of every row (-1 = unassigned)
+        self.centroids = None
+        self.assignments = np.zeros(0, dtype=np.int32)
+
+    @property
+    def embeddings(self):
+        return self._embeddings
+
+    @property
+    def vectors_path(self):
+        return os.path.join(self.directory, VECTOR_FILES[self.dtype])
+
+    @property
+    def meta_path(self):
+        return os.path.join(self.directory, 'meta.json')
+
+    @property
+    def ivf_path(self):
+        return os.path.join(self.directory, 'ivf.npz')
+
+    @staticmethod
+    def exists(directory):
+        return os.path.exists(os.path.join(directory, 'meta.json'))
+
+    @classmethod
+    def load(cls, directory, embeddings, **kwargs):
+        """Open a persisted store without re-embedding anything."""
+        store = cls(directory, embeddings, **kwargs)
+        with open(store.meta_path, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        if meta.get('version') != LOCAL_INDEX_VERSION:
+            raise ValueError(f"Unsupported local index version: {meta.get('version')}")
+        # The matrix on disk keeps the dtype it was written with
+        store.dtype = meta.get('dtype', 'float32')
+        store.dimension = meta['dimension']
+        store.ids = meta['ids']
+        store.texts = meta['texts']
+        store.columns = meta['columns']
+        store.count = len(store.ids)
+        store.live = np.array([point_id is not None for point_id in store.ids], dtype=bool)
+        store.row_by_id = {point_id: row for row, point_id in enumerate(store.ids) if point_id is not None}
+        capacity = max(store.count, 1)
+        store._vectors = np.memmap(store.vectors_path, dtype=store.dtype, mode='r+',
+                                   shape=(capacity, store.dimension))
+        store.assignments = np.full(store.count, -1, dtype=np.int32)
+        if os.path.exists(store.ivf_path):
+            ivf = np.load(store.ivf_path)
+            if len(ivf['assignments']) == store.count:
+                store.centroids = ivf['centroids']
+                store.assignments = ivf['assignments']
+        logger.info(f"Loaded local vector store with {store.count} vectors from {directory}")
+        return store
+
+    def clear(self):
+        """Remove every vector and the files backing them."""
+        with self.lock:
+            self._vectors = None
+            shutil.rmtree(self.directory, ignore_errors=True)
+            self.__init__(self.directory, self._embeddings, self.index_type,
+                          self.nprobe, self.ivf_min_points, self.dtype)
+
+    def __len__(self):
+        return int(self.live[:self.count].sum())
+
+    def count_points(self):
+        return len(self)
+
+    def iter_points(self, batch_size=1000):
+        """Yield (ids, vectors, texts, metadatas) for every live point, in batches, with float32 vectors."""
+        with self.lock:
+            rows = np.flatnonzero(self.live[:self.count])
+        for start in range(0, len(rows), batch_size):
+            batch = rows[start:start + batch_size]
+            with self.lock:
+                vectors = self._decode_rows(batch)
+                ids = [self.ids[row] for row in batch]
+                texts = [self.texts[row] for row in batch]
+                metadatas = [
+                    {key: values[row] for key, values in self.columns.items() if values[row] is not None}
+                    for row in batch
+                ]
+            yield ids, vectors, texts, metadatas
+
+    # Encoding
+
+    def _encode_rows(self, vectors):
+        """Convert normalised float32 vectors to the storage dtype."""
+        if self.dtype == 'int8':
+            return np.clip(np.rint(vectors * INT8_SCALE), -127, 127).astype(np.int8)
+        return vectors.astype(self.dtype, copy=False)
+
+    def _decode_rows(self, rows):
+        """Read matrix rows back as float32."""
+        vectors = np.asarray(self._vectors[rows], dtype=np.float32)
+        if self.dtype == 'int8':
+            vectors /= INT8_SCALE
+        return vectors
+
+    # Writing
+
+    def _ensure_capacity(self, needed):
+        capacity = 0 if self._vectors is None else self._vectors.shape[0]
+        if needed <= capacity:
+            return
+        new_capacity = max(needed, capacity * 2, 1024)
+        os.makedirs(self.directory, exist_ok=True)
+        if self._vectors is not None:
+            self._vectors.flush()
+            del self._vectors
+        # Growing the file in place keeps existing rows; new rows are zero-filled
+        with open(self.vectors_path, 'ab') as f:
+            f.truncate(new_capacity * self.dimension * np.dtype(self.dtype).itemsize)
+        self._vectors = np.memmap(self.vectors_path, dtype=self.dtype, mode='r+',
+                                  shape=(new_capacity, self.dimension))
+        self.live = np.concatenate([self.live, np.zeros(new_capacity - len(self.live), dtype=bool)])
+        self.assignments = np.concatenate([
+            self.assignments, np.full(new_capacity - len(self.assignments), -1, dtype=np.int32)
+        ])
+
+    def add_vectors(self, vectors, texts, metadatas, ids):
+        """Insert or replace points with precomputed vectors (an (n, dimension) array)."""
+        vectors = _normalise(vectors)
+        encoded = self._encode_rows(vectors)
+        with self.lock:
+            self._mask_cache.clear()
+            self._dirty = True
+            if self.dimension is None:
+                self.dimension = vectors.shape[1]
+            self._ensure_capacity(self.count + len(ids))
+            for vector, stored, text, metadata, point_id in zip(vectors, encoded, texts, metadatas, ids):
+                row = self.row_by_id.get(point_id)
+                if row is None:
+                    row = self.count
+                    self.count += 1
+                    self.ids.append(point_id)
+                    self.texts.append(text)
+                    for values in self.columns.values():
+                        values.append(None)
+                    self.row_by_id[point_id] = row
+                else:
+                    self.texts[row] = text
+                for key, value in (metadata or {}).items():
+                    if key not in self.columns:
+                        self.columns[key] = [None] * self.count
+                    self.columns[key][row] = value
+                self._vectors[row] = stored
+                self.live[row] = True
+                if self.centroids is not None:
+                    self.assignments[row] = int(np.argmax(self.centroids @ vector))
+        return list(ids)
+
+    def add_texts(self, texts, metadatas=None, *, ids=None, **kwargs):
+        texts = list(texts)
+        metadatas = metadatas or [{} for _ in texts]
+        if ids is None:
+            raise ValueError("LocalVectorStore requires explicit point ids")
+        if hasattr(self._embeddings, 'embed_documents_array'):
+            vectors = self._embeddings.embed_documents_array(texts)
+        else:
+            vectors = self._embeddings.embed_documents(texts)
+        return self.add_vectors(vectors, texts, metadatas, ids)
+
+    def delete(self, ids=None, **kwargs):
+        with self.lock:
+            for point_id in ids or []:
+                row = self.row_by_id.pop(point_id, None)
+                if row is not None:
+                    self.live[row] = False
+                    self._dirty = True
+        return True
+
+    def build_ivf(self, n_clusters=None):
+        """(Re)build the inverted-file index from the live vectors."""
+        with self.lock:
+            rows = np.flatnonzero(self.live[:self.count])
+            if len(rows) == 0:
+                return
+            n_clusters = n_clusters or max(1, int(np.sqrt(len(rows))))
+            vectors = self._decode_rows(rows)
+            sample = vectors
+            if len(vectors) > n_clusters * 256:
+                sample = vectors[np.random.default_rng(0).choice(len(vectors), n_clusters * 256, replace=False)]
+            self.centroids = _kmeans(sample, min(n_clusters, len(sample)))
+            self.assignments[:self.count] = -1
+            self.assignments[rows] = np.argmax(vectors @ self.centroids.T, axis=1)
+            self._dirty = True
+        logger.info(f"Built IVF index with {len(self.centroids)} clusters over {len(rows)} vectors")
+
+    def persist(self):
+        """Write the matrix and metadata columns to disk if anything changed since the last persist.
+
+        Tombstoned rows are compacted away first once they are at least
+        COMPACT_DEAD_FRACTION of the rows. Searches wait only while the columns
+        are copied; serialising and writing them happens outside the lock.
+        """
+        if self.index_type == 'ivf' and self.centroids is None and len(self) >= self.ivf_min_points:
+            self.build_ivf()
+        with self._persist_lock:
+            with self.lock:
+                if self.dimension is None or (not self._dirty and os.path.exists(self.meta_path)):
+                    return
+                dead = self.count - int(self.live[:self.count].sum())
+                if dead and dead >= self.count * COMPACT_DEAD_FRACTION:
+                    self._compact()
+                live = self.live[:self.count].tolist()
+                meta = {
+                    'version': LOCAL_INDEX_VERSION,
+                    'dimension': self.dimension,
+                    'dtype': self.dtype,
+                    'ids': [point_id if alive else None for point_id, alive in zip(self.ids, live)],
+                    'texts': list(self.texts),
+                    'columns': {key: list(values) for key, values in self.columns.items()}
+                }
+                vectors = self._vectors
+                centroids = self.centroids
+                assignments = self.assignments[:self.count].copy()
+                self._dirty = False
+
+            try:
+                vectors.flush()
+                tmp_path = f"{self.meta_path}.tmp"
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(meta, f)
+                os.replace(tmp_path, self.meta_path)
+                if centroids is not None:
+                    np.savez(self.ivf_path, centroids=centroids, assignments=assignments)
+            except BaseException:
+                self._dirty = True
+                raise
+
+    def _compact(self):
+        """Move the live rows to the front of the matrix and drop the tombstones; holds the lock."""
+        keep = np.flatnonzero(self.live[:self.count])
+        self._vectors[:len(keep)] = self._vectors[keep]
+        self.assignments[:len(keep)] = self.assignments[keep]
+        self.ids = [self.ids[row] for row in keep]
+        self.texts = [self.texts[row] for row in keep]
+        self.columns = {key: [values[row] for row in keep] for key, values in self.columns.items()}
+        self.count = len(keep)
+        self.live[:] = False
+        self.live[:self.count] = True
+        self.row_by_id = {point_id: row for row, point_id in enumerate(self.ids)}
+        self._mask_cache.clear()
+
+    # Searching
+
+    def _condition_mask(self, field, values):
+        key = (field, values)
+        mask = self._mask_cache.get(key)
+        if mask is None or len(mask) != self.count:
+            allowed = set(values)
+            column = self.columns.get(field, ())
+            mask = np.fromiter(
+                (value is not None and value_matches(value, allowed) for value in column),
+                dtype=bool, count=len(column)
+            )
+            if len(mask) < self.count:
+                mask = np.concatenate([mask, np.zeros(self.count - len(mask), dtype=bool)])
+            self._mask_cache[key] = mask
+        return mask
+
+    def _candidate_rows(self, query_vector, conditions=()):
+        live_rows = self.live[:self.count]
+        for field, values in conditions:
+            live_rows = live_rows & self._condition_mask(field, values)
+        if self.centroids is None:
+            return np.flatnonzero(live_rows)
+        if conditions and live_rows.sum() < self.ivf_min_points:
+            # A selective filter leaves few enough rows to scan exactly
+            return np.flatnonzero(live_rows)
+        probes = np.argsort(self.centroids @ query_vector)[::-1][:self.nprobe]
+        in_probed = np.isin(self.assignments[:self.count], probes)
+        # Rows added since the last build that could not be assigned are always scanned
+        unassigned = self.assignments[:self.count] == -1
+        return np.flatnonzero(live_rows & (in_probed | unassigned))
+
+    def similarity_search_with_score_by_vector(self, embedding, k=4, filter=None, **kwargs):
+        query_vector = _normalise(embedding)
+        with self.lock:
+            if self.count == 0:
+                return []
+            rows = self._candidate_rows(query_vector, filter or ())
+            if len(rows) == 0:
+                return []
+            scores = self._decode_rows(rows) @ query_vector
+            k = min(k, len(rows))
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            return [(self._document(rows[index]), float(scores[index])) for index in top]
+
+    def _document(self, row):
+        metadata = {key: values[row] for key, values in self.columns.items() if values[row] is not None}
+        metadata['_id'] = self.ids[row]
+        return Document(page_content=self.texts[row], metadata=metadata)
+
+    def get_documents(self, ids):
+        """Fetch points by ID as Documents, in the order given; missing IDs are skipped."""
+        with self.lock:
+            rows = [self.row_by_id.get(point_id) for point_id in ids]
+            return [self._document(row) for row in rows if row is not None]
+
+    def similarity_search_with_score(self, query, k=4, **kwargs):
+        return self.similarity_search_with_score_by_vector(self._embeddings.embed_query(query), k, **kwargs)
+
+    def similarity_search(self, query, k=4, **kwargs):
+        return [doc for doc, _ in self.similarity_search_with_score(query, k, **kwargs)]
+
+    @classmethod
+    def from_texts(cls, texts, embedding, metadatas=None, *, ids=None, directory=None, **kwargs):
+        store = cls(directory, embedding, **kwargs)
+        store.add_texts(texts, metadatas, ids=ids)
+        store.persist()
+        return store
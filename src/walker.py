@@ -0,0 +1,230 @@
+import logging
+import os
+import re
+from collections import namedtuple
+
+logger = logging.getLogger(__name__)
+
+# A file selected for indexing, with the stat result taken during the walk
+FileEntry = namedtuple('FileEntry', ['path', 'rel_path', 'stat'])
+
+
+def _translate_glob(pattern):
+    """Translate a gitignore glob into a regex fragment."""
+    i, n = 0, len(pattern)
+    out = []
+    while i < n:
+        c = pattern[i]
+        if c == '*':
+            if pattern.startswith('**/', i):
+                out.append('(?:.*/)?')
+                i += 3
+                continue
+            if pattern.startswith('**', i):
+                out.append('.*')
+                i += 2
+                continue
+            out.append('[^/]*')
+        elif c == '?':
+            out.append('[^/]')
+        elif c == '[':
+            end = pattern.find(']', i + 1)
+            if end == -1:
+                out.append(re.escape(c))
+            else:
+                body = pattern[i + 1:end]
+                if body.startswith('!'):
+                    body = '^' + body[1:]
+                out.append(f"[{body.replace(chr(92), chr(92) * 2)}]")
+                i = end
+        elif c == '\\' and i + 1 < n:
+            i += 1
+            out.append(re.escape(pattern[i]))
+        else:
+            out.append(re.escape(c))
+        i += 1
+    return ''.join(out)
+
+
+class GitIgnore:
+    """Compiled rules of a single .gitignore file, matched relative to its directory."""
+
+    def __init__(self, lines):
+        # (compiled regex, negated, directory only) in file order; the last match wins
+        self.rules = []
+        for line in lines:
+            line = line.rstrip('\n').rstrip()
+            if not line or line.startswith('#'):
+                continue
+            negated = line.startswith('!')
+            if negated:
+                line = line[1:]
+            elif line.startswith('\\'):
+                line = line[1:]
+            dir_only = line.endswith('/')
+            line = line.rstrip('/')
+            if not line:
+                continue
+            if '/' in line:
+                # Patterns with a slash are anchored to the .gitignore's directory
+                regex = _translate_glob(line.lstrip('/'))
+            else:
+                regex = '(?:.*/)?' + _translate_glob(line)
+            self.rules.append((re.compile(f'^{regex}$'), negated, dir_only))
+
+    @classmethod
+    def from_file(cls, path):
+        try:
+            with open(path, 'r', encoding='utf-8', errors='replace') as f:
+                return cls(f.readlines())
+        except OSError as e:
+            logger.warning(f"Could not read {path}: {e}")
+            return cls([])
+
+    def match(self, rel_path, is_dir):
+        """Return True (ignored), False (explicitly re-included) or None (no rule matched)."""
+        result = None
+        for regex, negated, dir_only in self.rules:
+            if dir_only and not is_dir:
+                continue
+            if regex.match(rel_path):
+                result = not negated
+        return result
+
+
+class IgnoreMatcher:
+    """Precompiled skip-dir, extension and .gitignore checks for one indexing run."""
+
+    def __init__(self, skip_dirs, file_patterns, use_gitignore=True):
+        self.skip_dirs = frozenset(d.lower() for d in skip_dirs)
+        self.extensions = tuple(file_patterns)
+        self.use_gitignore = use_gitignore
+
+    def skip_directory(self, name):
+        lowered = name.lower()
+        return lowered in self.skip_dirs or 'cache' in lowered
+
+    def include_file(self, name):
+        return name.endswith(self.extensions)
+
+
+def _is_ignored(gitignores, rel_path, is_dir):
+    """Apply the .gitignore files that are in scope, deepest last so it wins."""
+    ignored = False
+    for base, gitignore in gitignores:
+        if base:
+            if not rel_path.startswith(base + '/'):
+                continue
+            local_path = rel_path[len(base) + 1:]
+        else:
+            local_path = rel_path
+        result = gitignore.match(local_path, is_dir)
+        if result is not None:
+            ignored = result
+    return ignored
+
+
+def iter_repository(root, matcher, rel_start='', gitignores=()):
+    """Walk ``root`` once with os.scandir and yield a FileEntry per indexable file.
+
+    Directories are visited in sorted order so the output is deterministic.
+    ``rel_start`` restricts the walk to a subdirectory, with ``gitignores``
+    holding the .gitignore files of its parents.
+    """
+    # (absolute dir, rel dir, .gitignore files in scope as (rel base, GitIgnore))
+    stack = [(os.path.join(root, rel_start) if rel_start else root, rel_start, tuple(gitignores))]
+    while stack:
+        directory, rel_dir, gitignores = stack.pop()
+        try:
+            with os.scandir(directory) as it:
+                entries = sorted(it, key=lambda e: e.name)
+        except OSError as e:
+            logger.warning(f"Could not list {directory}: {e}")
+            continue
+
+        if matcher.use_gitignore and any(e.name == '.gitignore' for e in entries):
+            gitignores = gitignores + ((rel_dir, GitIgnore.from_file(os.path.join(directory, '.gitignore'))),)
+
+        subdirs = []
+        for entry in entries:
+            rel_path = f"{rel_dir}/{entry.name}" if rel_dir else entry.name
+            try:
+                is_dir = entry.is_dir(follow_symlinks=False)
+            except OSError:
+                continue
+            if is_dir:
+                if matcher.skip_directory(entry.name) or _is_ignored(gitignores, rel_path, True):
+                    logger.debug(f"Skipping directory: {rel_path}")
+                    continue
+                subdirs.append((entry.path, rel_path, gitignores))
+            elif matcher.include_file(entry.name) and not _is_ignored(gitignores, rel_path, False):
+                try:
+                    yield FileEntry(entry.path, rel_path, entry.stat())
+                except OSError as e:
+                    logger.warning(f"Could not stat {rel_path}: {e}")
+
+        # Reversed so the stack pops subdirectories in sorted order
+        stack.extend(reversed(subdirs))
+
+
+def scan_repository(root, matcher):
+    """Walk the repository once and return the list of indexable FileEntries.
+
+    The list is shared by validation, counting and processing so the tree is
+    only walked a single time per indexing run.
+    """
+    return list(iter_repository(root, matcher))
+
+
+def _parent_gitignores(root, rel_dir, matcher, loaded):
+    """The .gitignore files in scope for entries of ``rel_dir``, root first."""
+    if not matcher.use_gitignore:
+        return ()
+    if rel_dir not in loaded:
+        parent = _parent_gitignores(root, os.path.dirname(rel_dir), matcher, loaded) if rel_dir else ()
+        path = os.path.join(root, rel_dir, '.gitignore')
+        if os.path.isfile(path):
+            parent = parent + ((rel_dir, GitIgnore.from_file(path)),)
+        loaded[rel_dir] = parent
+    return loaded[rel_dir]
+
+
+def resolve_paths(root, rel_paths, matcher):
+    """Apply the walk's rules to a set of changed paths.
+
+    Returns (entries, gone): FileEntries for the indexable files among
+    ``rel_paths`` (directories are walked), and the paths that no longer
+    exist or are now excluded, whose indexed files must be removed.
+    """
+    entries = {}
+    gone = set()
+    loaded = {}
+    for rel_path in sorted(rel_paths):
+        parts = rel_path.split('/')
+        path = os.path.join(root, *parts)
+        rel_dir = os.path.dirname(rel_path)
+        ancestors = ['/'.join(parts[:i]) for i in range(1, len(parts))]
+        if any(matcher.skip_directory(part) for part in parts[:-1]) or any(
+            _is_ignored(_parent_gitignores(root, os.path.dirname(ancestor), matcher, loaded), ancestor, True)
+            for ancestor in ancestors
+        ):
+            # Inside a directory the walk would never enter
+            gone.add(rel_path)
+            continue
+        gitignores = _parent_gitignores(root, rel_dir, matcher, loaded)
+        try:
+            stat_result = os.stat(path, follow_symlinks=False)
+        except OSError:
+            gone.add(rel_path)
+            continue
+        if os.path.isdir(path) and not os.path.islink(path):
+            if matcher.skip_directory(parts[-1]) or _is_ignored(gitignores, rel_path, True):
+                gone.add(rel_path)
+                continue
+            for entry in iter_repository(root, matcher, rel_path, gitignores):
+                entries[entry.rel_path] = entry
+        elif matcher.include_file(parts[-1]) and not _is_ignored(gitignores, rel_path, False):
+            entries[rel_path] = FileEntry(path, rel_path, stat_result)
+        else:
+            gone.add(rel_path)
+    return [entries[key] for key in sorted(entries)], gone
@@ -0,0 +1,154 @@
+import logging
+import os
+import threading
+import time
+
+from src.walker import scan_repository
+
+logger = logging.getLogger(__name__)
+
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+except ImportError:  # watchdog is optional; fall back to polling
+    FileSystemEventHandler = object
+    Observer = None
+
+# Event types that can change what should be indexed
+CHANGE_EVENTS = {'created', 'modified', 'deleted', 'moved', 'closed'}
+
+
+class _EventHandler(FileSystemEventHandler):
+    def __init__(self, watcher):
+        self.watcher = watcher
+
+    def on_any_event(self, event):
+        if event.event_type not in CHANGE_EVENTS:
+            return
+        if event.is_directory and event.event_type == 'modified':
+            # Directory mtime bumps only echo changes we also get per file
+            return
+        paths = [event.src_path]
+        if getattr(event, 'dest_path', None):
+            paths.append(event.dest_path)
+        self.watcher.notify(paths)
+
+
+class RepositoryWatcher:
+    """Watch a repository and report batches of changed paths.
+
+    Uses inotify (through watchdog) when available and falls back to
+    polling the tree every ``poll_interval`` seconds. Changes are debounced:
+    a batch is delivered once no new change has arrived for ``debounce``
+    seconds, or after ``max_wait`` seconds of continuous activity, so a
+    branch switch produces one batch instead of thousands. ``on_changes``
+    receives a set of paths relative to ``root`` (files or directories,
+    existing or deleted) and runs on the watcher's own thread.
+    """
+
+    def __init__(self, root, on_changes, matcher_factory, debounce=2.0, max_wait=30.0,
+                 poll_interval=5.0, backend='auto'):
+        self.root = root
+        self.on_changes = on_changes
+        self.matcher_factory = matcher_factory
+        self.debounce = debounce
+        self.max_wait = max_wait
+        self.poll_interval = poll_interval
+        self.backend = backend
+
+        self._pending = set()
+        self._first_change = None
+        self._last_change = None
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._observer = None
+        self._threads = []
+
+    def start(self):
+        use_inotify = self.backend in ('auto', 'inotify') and Observer is not None
+        if self.backend == 'inotify' and Observer is None:
+            logger.warning("watchdog is not installed, falling back to polling")
+        if use_inotify:
+            try:
+                self._observer = Observer()
+                self._observer.schedule(_EventHandler(self), self.root, recursive=True)
+                self._observer.start()
+                logger.info(f"Watching {self.root} for changes (inotify)")
+            except OSError as e:
+                # e.g. the inotify watch limit is exhausted on a huge tree
+                logger.warning(f"Could not start inotify watcher, falling back to polling: {e}")
+                self._observer = None
+        if self._observer is None:
+            self._start_thread(self._poll_loop, 'repo-watcher-poll')
+            logger.info(f"Watching {self.root} for changes (polling every {self.poll_interval}s)")
+        self._start_thread(self._debounce_loop, 'repo-watcher')
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        if self._observer is not None:
+            self._observer.stop()
+            self._observer.join()
+        for thread in self._threads:
+            thread.join()
+
+    def _start_thread(self, target, name):
+        thread = threading.Thread(target=target, name=name, daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+    def notify(self, paths):
+        """Record changed absolute paths."""
+        now = time.monotonic()
+        with self._lock:
+            for path in paths:
+                rel_path = os.path.relpath(path, self.root)
+                if rel_path.startswith('..') or rel_path == '.':
+                    continue
+                if rel_path == '.git' or rel_path.startswith('.git' + os.sep):
+                    continue
+                self._pending.add(rel_path.replace(os.sep, '/'))
+            if self._first_change is None:
+                self._first_change = now
+            self._last_change = now
+        self._wake.set()
+
+    def _debounce_loop(self):
+        while not self._stop.is_set():
+            self._wake.wait(timeout=self.debounce)
+            self._wake.clear()
+            with self._lock:
+                if not self._pending:
+                    continue
+                now = time.monotonic()
+                quiet = now - self._last_change >= self.debounce
+                overdue = now - self._first_change >= self.max_wait
+                if not (quiet or overdue):
+                    continue
+                batch, self._pending = self._pending, set()
+                self._first_change = self._last_change = None
+            logger.info(f"Applying {len(batch)} changed paths from the watcher")
+            try:
+                self.on_changes(batch)
+            except Exception as e:
+                logger.error(f"Error applying watched changes: {e}")
+
+    def _snapshot(self):
+        entries = scan_repository(self.root, self.matcher_factory())
+        return {entry.rel_path: (entry.stat.st_mtime, entry.stat.st_size) for entry in entries}
+
+    def _poll_loop(self):
+        previous = self._snapshot()
+        while not self._stop.wait(self.poll_interval):
+            try:
+                current = self._snapshot()
+            except OSError as e:
+                logger.warning(f"Polling {self.root} failed: {e}")
+                continue
+            changed = {path for path, stamp in current.items() if previous.get(path) != stamp}
+            changed.update(path for path in previous if path not in current)
+            previous = current
+            if changed:
+                self.notify(os.path.join(self.root, path) for path in changed)